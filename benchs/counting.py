@@ -0,0 +1,81 @@
+#------------------------------------------------------------------------------------#
+# counting.py: Counting check                                                        #
+# Copyright © 2015 - 2019 Thales SA - All Rights Reserved                            #
+# Author: Pierre Savéant                                                             #
+# This software is released as Open Source under the terms of a 3-clause BSD license #
+#------------------------------------------------------------------------------------#
+
+from argparse import ArgumentParser
+from itertools import product
+from random import Random
+import sys
+import cobra
+
+# Counting check: the number of solutions given by count(), optimize() and solutions() on small models, each built in its own Model,
+# is compared with a brute force enumeration of the domains. The fixed cases come first, then random models drawn from the seeds.
+# A mismatch is printed and the exit status is 1.
+
+#python -O -m benchs.counting 0 2000
+
+def infxycEntailed(): # x1 <= x0 - 2 is entailed once x0 != 3: count() used to take a node for a leaf too early
+    x0 = cobra.Var('X0', 3, 6)
+    x1 = cobra.Var('X1', 2, 3)
+    cobra.infxyc(x1, x0, -2)
+    cobra.nequxc(x0, 3)
+    return [x0, x1], [lambda s: s[x1] <= s[x0] - 2, lambda s: s[x0] != 3]
+
+def infxycDisjunction(): # A disjunction of Infxyc sides did not keep all the solutions
+    x0 = cobra.Var('X0', 0, 4)
+    x1 = cobra.Var('X1', 0, 4)
+    cobra.disjunction(cobra.Infxyc(x0, x1, -1), cobra.Infxyc(x1, x0, -1))
+    return [x0, x1], [lambda s: s[x0] <= s[x1] - 1 or s[x1] <= s[x0] - 1]
+
+CASES = [infxycEntailed, infxycDisjunction]
+
+def random(seed): # Variables and the checks of their constraints
+    rnd = Random(seed)
+    n = rnd.randint(2, 6)
+    vs = [(cobra.BitVar if rnd.random() < .4 else cobra.Var)('X'+str(i), 0, rnd.randint(0, 4)) for i in range(n)]
+    checks = []
+    for _ in range(rnd.randint(0, 4)):
+        kind = rnd.randrange(8)
+        a, b = rnd.sample(vs, 2)
+        c = rnd.randint(-2, 2)
+        if kind == 0: cobra.supxyc(a, b, c); checks.append(lambda s, a=a, b=b, c=c: s[a] >= s[b] + c)
+        elif kind == 1: cobra.infxyc(a, b, c); checks.append(lambda s, a=a, b=b, c=c: s[a] <= s[b] + c)
+        elif kind == 2: cobra.nequxyc(a, b, c); checks.append(lambda s, a=a, b=b, c=c: s[a] != s[b] + c)
+        elif kind == 3: cobra.equxyc(a, b, c); checks.append(lambda s, a=a, b=b, c=c: s[a] == s[b] + c)
+        elif kind == 4: x = rnd.randint(0, 4); cobra.nequxc(a, x); checks.append(lambda s, a=a, x=x: s[a] != x)
+        elif kind == 5: l = rnd.sample(vs, rnd.randint(2, n)); cobra.allDifferent(l); checks.append(lambda s, l=l: len({s[v] for v in l}) == len(l))
+        elif kind == 6: cobra.disjunction(cobra.Supxyc(a, b, c), cobra.Supxyc(b, a, -c)); checks.append(lambda s, a=a, b=b, c=c: s[a] >= s[b] + c or s[b] >= s[a] - c)
+        else: cobra.disjunction(cobra.Infxyc(a, b, c), cobra.Infxyc(b, a, -c-2)); checks.append(lambda s, a=a, b=b, c=c: s[a] <= s[b] + c or s[b] <= s[a] - c - 2)
+    return vs, checks
+
+def check(name, build): # Mismatches of the counts on the model, as strings
+    with cobra.Model():
+        try: vs, checks = build()
+        except cobra.FAIL: return [] # Failed at the root
+        brute = sum(1 for t in product(*[list(v.values()) for v in vs]) if all(f(dict(zip(vs, t))) for f in checks))
+        bad = []
+        for search in (2, 3):
+            for varChoice in (0, 1):
+                for propagation in (cobra.EAGER, cobra.QUEUE):
+                    opt = cobra.Optimizer(None, search=search, root=False, varChoice=varChoice, propagation=propagation)
+                    counts = opt.count().nsol, opt.optimize().nsol, sum(1 for _ in opt.solutions())
+                    if any(n != brute for n in counts):
+                        bad.append("{} search={} varChoice={} propagation={}: brute force {}, count {}, optimize {}, solutions {}".format(name, search, varChoice, propagation, brute, *counts))
+        return bad
+
+def main(first=0, last=1000):
+    bad = [m for case in CASES for m in check(case.__name__, case)]
+    bad += [m for seed in range(first, last) for m in check("seed {}".format(seed), lambda: random(seed))]
+    for m in bad: print(m)
+    print("{} mismatch(es) on {} cases and {} random models".format(len(bad), len(CASES), max(0, last - first)))
+    return 1 if bad else 0
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Counting Check')
+    parser.add_argument("first", help="First seed of the random models", type=int, nargs='?', default=0)
+    parser.add_argument("last", help="Seed after the last one", type=int, nargs='?', default=1000)
+    args = parser.parse_args()
+    sys.exit(main(args.first, args.last))
@@ -0,0 +1,75 @@
+#------------------------------------------------------------------------------------#
+# jobshop.py: Job-Shop benchmark                                                     #
+# Copyright © 2015 - 2019 Thales SA - All Rights Reserved                            #
+# Author: Pierre Savéant                                                             #
+# This software is released as Open Source under the terms of a 3-clause BSD license #
+#------------------------------------------------------------------------------------#
+
+from argparse import ArgumentParser
+from random import Random
+import cobra
+
+# Job-Shop benchmark: each job is a sequence of operations, one on each machine, a machine runs one operation at a time. Find the schedule of minimal makespan.
+# The instances are generated from a seed as in Taillard 1993: durations in [1, 99] and a random order of the machines for each job.
+
+#python -O -m benchs.jobshop 5 5
+#python -O -m benchs.jobshop 8 8 -m 0.5 -g 0.2
+
+def instance(jobs, machines, seed=0): # The (machine, duration) operations of each job
+    rnd = Random(seed)
+    return [[(m, rnd.randint(1, 99)) for m in rnd.sample(range(machines), machines)] for _ in range(jobs)]
+
+def jobshop(inst, unary=False, search=0, network=False): # Returns the STOP interval
+    if network: cobra.temporalNetwork()
+    horizon = sum(p for job in inst for m, p in job)
+    stop = cobra.Interval('STOP', cobra.START, 0, horizon)
+    machines = {}
+    with cobra.batch():
+        for j, job in enumerate(inst):
+            prev = None
+            for k, (m, p) in enumerate(job):
+                t = cobra.Interval('J{}O{}'.format(j, k), cobra.START, p, horizon)
+                if prev: cobra.endBeforeStart(prev, t)
+                machines.setdefault(m, []).append(t)
+                prev = t
+            cobra.endBeforeStart(prev, stop)
+        for m, tasks in sorted(machines.items()):
+            if unary:
+                cobra.noOverlap(tasks)
+                if search == 1: continue # SetTimes does not branch on disjunctions
+            for i, t1 in enumerate(tasks[:-1]):
+                for t2 in tasks[i+1:]:
+                    cobra.ordering(t2.st, t2.sp, t1.st, t1.sp)
+    return stop
+
+def main(jobs, machines, seed=0, search=0, unary=False, root=True, verbose=0, disjStatic=2, disjChoice=1, disjSide=0, propagation=cobra.EAGER, timeout=None, network=False, monitor=None, gap=None):
+    cobra.Logprint(verbose)
+    stop = jobshop(instance(jobs, machines, seed), unary, search, network)
+    optimizer = cobra.Optimizer(stop.st, search, mini=True, root=root, disjStatic=disjStatic, disjChoice=disjChoice, disjSide=disjSide, propagation=propagation)
+    if monitor is not None or gap is not None: # Progress snapshots, stop once the gap is reached
+        def progress(opt, s):
+            print("{:8.2f}s nodes={} ({:.0f}/s) depth={} trail={} backtracks={} best={} bound={} gap={}".format(s.time, s.nodes, s.rate, s.depth, s.trail, s.backtracks, s.best, s.bound, None if s.gap is None else round(s.gap, 3)))
+            return gap is not None and s.gap is not None and s.gap <= gap
+        optimizer.observe(progress=progress if monitor is not None else None, solution=lambda opt, v: gap is not None and opt.progress().gap <= gap, period=monitor or 1.0)
+    sol = optimizer.optimize(timeout)
+    print("Optimization {}, {} in {:>8} backtracks ({:>8} for proof) and {}".format("completed" if sol.completion else "interrupted", "min({})={}".format(sol.objname, sol.objvalue) if sol.vars else "no solution found", sol.backtracks, sol.proof, sol.duration))
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Job-Shop Benchmark')
+    parser.add_argument("jobs", help="Number of jobs", type=int)
+    parser.add_argument("machines", help="Number of machines", type=int)
+    parser.add_argument("-r", "--seed", type=int, help="Seed of the instance generator", default=0)
+    parser.add_argument("-s", "--search", type=int, choices=[0, 1], help="0=disjunctive search, 1=SetTimes search", default=0)
+    parser.add_argument("-u", "--unary", help="-u=noOverlap constraint on each machine (alone with SetTimes search)", action='store_true', default=False)
+    parser.add_argument("-b", "--branchANDbound", help="-b=Branch and Bound, default=Root", action='store_true', default=False)
+    parser.add_argument("-v", "--verbose", type=int, choices=[0, 2, 3, 4, 5], help="0=quiet, 2=search progression, 4=constraint propagation, 5=trailing", default=0)
+    parser.add_argument("-x", "--disjStatic", type=int, choices=[0, 1, 2, 3, 4], help="as in benchs.sched_bridge_direct_simple", default=2)
+    parser.add_argument("-y", "--disjChoice", type=int, choices=[0, 1, 2, 3, 4, 5], help="as in benchs.sched_bridge_direct_simple", default=1)
+    parser.add_argument("-z", "--disjSide", type=int, choices=[0, 1, 2, 3, 4, 5, 6], help="as in benchs.sched_bridge_direct_simple", default=0)
+    parser.add_argument("-p", "--propagation", type=int, choices=[0, 1], help="0=eager, 1=queue-based", default=0)
+    parser.add_argument("-n", "--network", help="-n=precedences and decided disjunctions as edges of a single temporal network", action='store_true', default=False)
+    parser.add_argument("-t", "--timeout", help="Budget time in seconds (or fractions thereof)", type=float, default=None)
+    parser.add_argument("-m", "--monitor", help="Period of the progress snapshots in seconds", type=float, default=None)
+    parser.add_argument("-g", "--gap", help="Stop once the gap between the best makespan and the root bound is within this ratio", type=float, default=None)
+    args = parser.parse_args()
+    main(args.jobs, args.machines, seed=args.seed, search=args.search, unary=args.unary, root=not(args.branchANDbound), verbose=args.verbose, disjStatic=args.disjStatic, disjChoice=args.disjChoice, disjSide=args.disjSide, propagation=args.propagation, timeout=args.timeout, network=args.network, monitor=args.monitor, gap=args.gap)
@@ -0,0 +1,48 @@
+#------------------------------------------------------------------------------------#
+# parallel.py: Parallel search check                                                 #
+# Copyright © 2015 - 2019 Thales SA - All Rights Reserved                            #
+# Author: Pierre Savéant                                                             #
+# This software is released as Open Source under the terms of a 3-clause BSD license #
+#------------------------------------------------------------------------------------#
+
+from argparse import ArgumentParser
+import sys
+import cobra
+from . import sched_bridge_direct_simple, queens
+
+# Parallel search check: the bridge is optimized by parallel() many times, each run must complete with the optimum of the
+# sequential run (104), and the solutions of the n-queens are counted in parallel as the sequential run does.
+# A mismatch is printed and the exit status is 1.
+
+#python -O -m benchs.parallel -r 20 -w 4
+
+def bridge(runs, workers):
+    bad = []
+    with cobra.Model():
+        stop = sched_bridge_direct_simple.bridge()
+        optimizer = cobra.Optimizer(stop.st)
+        for r in range(runs):
+            sol = optimizer.parallel(workers)
+            if not sol.completion or sol.objvalue != 104: bad.append("bridge run {}: {}={} completion={}".format(r, sol.objname, sol.objvalue, sol.completion))
+    return bad
+
+def counting(n, workers):
+    with cobra.Model():
+        queens.queens(n)
+        optimizer = cobra.Optimizer(None, search=2, root=False)
+        expected = optimizer.optimize().nsol
+        sol = optimizer.parallel(workers)
+        return [] if sol.completion and sol.nsol == expected else ["queens {}: {} solutions in parallel, {} expected".format(n, sol.nsol, expected)]
+
+def main(runs=20, workers=4):
+    bad = bridge(runs, workers) + counting(8, workers)
+    for m in bad: print(m)
+    print("{} mismatch(es) on {} parallel runs of the bridge and the 8-queens count".format(len(bad), runs))
+    return 1 if bad else 0
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Parallel Search Check')
+    parser.add_argument("-r", "--runs", type=int, help="Parallel runs of the bridge, default=20", default=20)
+    parser.add_argument("-w", "--workers", type=int, help="Number of worker processes, default=4", default=4)
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.workers))
@@ -7,32 +7,38 @@
 
 from argparse import ArgumentParser
 import cobra
-from sys import getrecursionlimit, setrecursionlimit
 
 # N-Queens benchmark: find all solutions (or the total number) to the problem of placing n chess queens on an n by n chessboard so that no two queens are on the same row, column or diagonal (since Bezzel 1848).
 
 #python -O -m benchs.queens 10 -f 1 -v 2 # for first solution
 #python -O -m benchs.queens 8 -b # for all solutions
 
-def queens(n):
-    q=[cobra.Var('Q'+str(i+1), 1, n) for i in range(n)]
+def queens(n, alldiff=False, bitset=False):
+    q=[(cobra.BitVar if bitset else cobra.Var)('Q'+str(i+1), 1, n) for i in range(n)]
+    if alldiff: # Rows and both diagonals as three global constraints
+        cobra.allDifferent(q)
+        cobra.allDifferent(q, range(n))
+        cobra.allDifferent(q, [-i for i in range(n)])
+        return
     for i in range(n):
         for j in range(i+1, n):
             cobra.nequxyc(q[i], q[j], 0)
             cobra.nequxyc(q[i], q[j], j-i)
             cobra.nequxyc(q[j], q[i], j-i)
 
-def main(n, search=2, root=True, verbose=0, varChoice=0, timeout=None):
+def main(n, search=2, root=True, verbose=0, varChoice=0, propagation=cobra.EAGER, alldiff=False, bitset=False, jobs=0, timeout=None, counting=False, profile=False):
     cobra.Logprint(verbose)
-    setrecursionlimit(2400)
+    if profile: cobra.profiling()
 
-    queens(n)
-    opt=cobra.Optimizer(None, search=search, root=root, varChoice=varChoice) # Enumeration on variables
-    varsol, objname, objvalue, backtracks, proof, duration, completion, nbsol = opt.optimize()
+    queens(n, alldiff, bitset)
+    opt=cobra.Optimizer(None, search=search, root=root, varChoice=varChoice, propagation=propagation) # Enumeration on variables
+    varsol, objname, objvalue, backtracks, proof, duration, completion, nbsol = opt.parallel(jobs) if jobs else opt.count(timeout=timeout) if counting else opt.optimize(timeout)
     if nbsol == 1: print("solution:", varsol)
+    if not completion: print("search interrupted")
     print("number of solutions =", nbsol)
     print("backtracks=", backtracks)
     print("runtime =", duration)
+    if opt.profile: print(opt.profile)
 
 if __name__ == "__main__":
     parser = ArgumentParser(description='N-Queens Benchmark')
@@ -41,9 +47,15 @@ if __name__ == "__main__":
     parser.add_argument("-b", "--branchANDbound", help="-b=Branch and Bound, default=Root", action='store_true', default=False) # for all solutions
     parser.add_argument("-v", "--verbose", type=int, choices=[0, 2, 4, 5], help="0=quiet, 2=search progression, 4=constraint propagation, 5=trailing", default=0)
     parser.add_argument("-f", "--varChoice", type=int, choices=[0, 1], help="0=no reordering, 1=minimum domain first", default=0)
+    parser.add_argument("-p", "--propagation", type=int, choices=[0, 1], help="0=eager, 1=queue-based", default=0)
+    parser.add_argument("-a", "--alldiff", help="-a=allDifferent constraints, default=binary constraints", action='store_true', default=False)
+    parser.add_argument("-d", "--bitset", help="-d=bitset domains (inner values removed), default=bounds", action='store_true', default=False)
+    parser.add_argument("-j", "--jobs", type=int, help="Number of processes sharing the search tree, default=0 (sequential search)", default=0)
+    parser.add_argument("-c", "--count", help="-c=count all the solutions without saving them", action='store_true', default=False)
     parser.add_argument("-t", "--timeout", help="Budget time in seconds (or fractions thereof)", type=float, default=None)
+    parser.add_argument("-P", "--profile", help="-P=report of the calls of the propagators per class and per constraint", action='store_true', default=False)
     args = parser.parse_args()
-    main(args.N, search=args.search, root=not(args.branchANDbound), verbose=args.verbose, varChoice=args.varChoice, timeout=args.timeout)
+    main(args.N, search=args.search, root=not(args.branchANDbound), verbose=args.verbose, varChoice=args.varChoice, propagation=args.propagation, alldiff=args.alldiff, bitset=args.bitset, jobs=args.jobs, timeout=args.timeout, counting=args.count, profile=args.profile)
 
  #   Board Size:       Number of Solutions to              Number of irregular         Number of semi-regular        Number of regular
  #   (length of one        N queens problem:                    Solutions:                  Solutions:                  Solutions:                                        
@@ -0,0 +1,58 @@
+#------------------------------------------------------------------------------------#
+# rcpsp.py: Resource-Constrained Project Scheduling benchmark                        #
+# Copyright © 2015 - 2019 Thales SA - All Rights Reserved                            #
+# Author: Pierre Savéant                                                             #
+# This software is released as Open Source under the terms of a 3-clause BSD license #
+#------------------------------------------------------------------------------------#
+
+from argparse import ArgumentParser
+from random import Random
+import cobra
+
+# RCPSP benchmark: activities linked by precedences share renewable resources of limited capacity. Find the schedule of minimal makespan.
+# The instances are generated from a seed: durations in [1, 10], up to 2 successors among the later activities, capacities in [4, 10] and demands up to the capacity.
+
+#python -O -m benchs.rcpsp 12
+
+def instance(activities, resources=2, seed=0): # (capacities, durations, demands, (pred, succ, lag) precedences)
+    rnd = Random(seed)
+    capacities = [rnd.randint(4, 10) for _ in range(resources)]
+    durations = [rnd.randint(1, 10) for _ in range(activities)]
+    demands = [[rnd.randint(0, c) for c in capacities] for _ in range(activities)]
+    precedences = [(a, b, 0) for a in range(activities) for b in rnd.sample(range(a+1, activities), min(rnd.randint(0, 2), activities-a-1))]
+    return capacities, durations, demands, precedences
+
+def rcpsp(inst, edgeFinding=False, network=False): # Returns the STOP interval
+    capacities, durations, demands, precedences = inst
+    if network: cobra.temporalNetwork()
+    horizon = sum(durations)
+    acts = [cobra.Interval('A'+str(i), cobra.START, p, horizon) for i, p in enumerate(durations)]
+    stop = cobra.Interval('STOP', cobra.START, 0, horizon)
+    with cobra.batch():
+        cobra.precedences(acts, precedences)
+        for a in acts: cobra.endBeforeStart(a, stop)
+        for r, capacity in enumerate(capacities):
+            users = [(a, d[r]) for a, d in zip(acts, demands) if d[r]]
+            if users: cobra.cumulative([a for a, d in users], [d for a, d in users], capacity, edgeFinding)
+    return stop
+
+def main(activities, resources=2, seed=0, root=True, verbose=0, propagation=cobra.EAGER, timeout=None, edgeFinding=False, network=False):
+    cobra.Logprint(verbose)
+    stop = rcpsp(instance(activities, resources, seed), edgeFinding, network)
+    optimizer = cobra.Optimizer(stop.st, 1, mini=True, root=root, propagation=propagation) # SetTimes search
+    sol = optimizer.optimize(timeout)
+    print("Optimization {}, {} in {:>8} backtracks ({:>8} for proof) and {}".format("completed" if sol.completion else "interrupted", "min({})={}".format(sol.objname, sol.objvalue) if sol.vars else "no solution found", sol.backtracks, sol.proof, sol.duration))
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='RCPSP Benchmark')
+    parser.add_argument("activities", help="Number of activities", type=int)
+    parser.add_argument("-k", "--resources", type=int, help="Number of resources", default=2)
+    parser.add_argument("-r", "--seed", type=int, help="Seed of the instance generator", default=0)
+    parser.add_argument("-b", "--branchANDbound", help="-b=Branch and Bound, default=Root", action='store_true', default=False)
+    parser.add_argument("-v", "--verbose", type=int, choices=[0, 2, 3, 4, 5], help="0=quiet, 2=search progression, 4=constraint propagation, 5=trailing", default=0)
+    parser.add_argument("-p", "--propagation", type=int, choices=[0, 1], help="0=eager, 1=queue-based", default=0)
+    parser.add_argument("-e", "--edgeFinding", help="-e=timetable edge finding on the resources", action='store_true', default=False)
+    parser.add_argument("-n", "--network", help="-n=precedences as edges of a single temporal network", action='store_true', default=False)
+    parser.add_argument("-t", "--timeout", help="Budget time in seconds (or fractions thereof)", type=float, default=None)
+    args = parser.parse_args()
+    main(args.activities, resources=args.resources, seed=args.seed, root=not(args.branchANDbound), verbose=args.verbose, propagation=args.propagation, timeout=args.timeout, edgeFinding=args.edgeFinding, network=args.network)
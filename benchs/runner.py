@@ -0,0 +1,179 @@
+#------------------------------------------------------------------------------------#
+# runner.py: Benchmark runner                                                        #
+# Copyright © 2015 - 2019 Thales SA - All Rights Reserved                            #
+# Author: Pierre Savéant                                                             #
+# This software is released as Open Source under the terms of a 3-clause BSD license #
+#------------------------------------------------------------------------------------#
+
+from argparse import ArgumentParser
+from time import perf_counter, process_time, strftime
+from statistics import median
+import subprocess
+import platform
+import json
+import csv
+import sys
+import os
+try: from resource import getrusage, RUSAGE_SELF
+except ImportError: getrusage = None # Not on Windows
+RSSMB = 1024 * 1024 if sys.platform == 'darwin' else 1024 # ru_maxrss per MB: in bytes on macOS, in KB elsewhere
+import cobra
+import store
+from . import queens, sched_bridge_direct_simple, jobshop, rcpsp
+
+# Runs the benchmarks over a sweep of instance sizes and configurations (model options
+# and Optimizer settings), each run repeated in a fresh process, and records for each run:
+# wall and cpu time of the run, build time of the model, backtracks, nodes, changes
+# (bound changes made by the propagation and the branching, recorded on the trails),
+# peak memory, objective, number of solutions and completion.
+# Optionally the propagation is profiled (cobra.profiling()) and the total number of calls
+# of the propagation methods is recorded as propagations (the times then include the probes).
+# The results are written as JSON (and CSV), and compared with a baseline: a median cpu
+# time slower than the baseline beyond the tolerance, or a change of the search (backtracks,
+# nodes, objective), is reported and the exit status is 1.
+
+#python -O -m benchs.runner -r 3 -o results.json
+#python -O -m benchs.runner queens -s 8 9 -c '{"varChoice": 1}' -b results.json
+#python -O -m benchs.runner jobshop -r 1 --propagations -o calls.json
+
+#------------------------------- Benchmarks -----------------------------------------
+# Each benchmark builds its model for a size and a configuration, and returns the Optimizer.
+
+def queensModel(n, alldiff=False, bitset=False, **settings): # All the solutions
+    queens.queens(n, alldiff, bitset)
+    return cobra.Optimizer(None, **dict(dict(search=2, root=False, propagation=cobra.QUEUE), **settings))
+
+def bridgeModel(size=None, unary=False, network=False, **settings):
+    stop = sched_bridge_direct_simple.bridge(unary, settings.get('search', 0), network)
+    return cobra.Optimizer(stop.st, **settings)
+
+def jobshopModel(n, seed=0, unary=False, network=False, **settings): # n jobs on n machines
+    stop = jobshop.jobshop(jobshop.instance(n, n, seed), unary, settings.get('search', 0), network)
+    return cobra.Optimizer(stop.st, **settings)
+
+def rcpspModel(n, seed=0, resources=2, edgeFinding=False, network=False, **settings): # n activities
+    stop = rcpsp.rcpsp(rcpsp.instance(n, resources, seed), edgeFinding, network)
+    return cobra.Optimizer(stop.st, **dict(dict(search=1), **settings))
+
+BENCHS = {
+    'queens': (queensModel, [6, 8, 9], [{}, dict(varChoice=1), dict(alldiff=True), dict(search=3)]),
+    'bridge': (bridgeModel, [None], [{}, dict(propagation=cobra.QUEUE), dict(network=True), dict(disjStatic=0, disjChoice=0, disjSide=0, root=False)]),
+    'jobshop': (jobshopModel, [4, 5, 6], [{}, dict(network=True), dict(unary=True, search=1)]),
+    'rcpsp': (rcpspModel, [8, 10, 12], [{}, dict(edgeFinding=True), dict(network=True)]),
+}
+
+COUNTS = ('backtracks', 'nodes', 'objective') # The search changed when one of them changes
+
+#------------------------------- Worker ---------------------------------------------
+
+def measure(bench, size, config, timeout=None, propagations=False): # One run in this process
+    if propagations: cobra.profiling()
+    wall, cpu = perf_counter(), process_time()
+    optimizer = BENCHS[bench][0](size, **config)
+    build = perf_counter() - wall
+    changes = store.changes()
+    sol = optimizer.optimize(timeout)
+    return dict(wall=perf_counter() - wall, cpu=process_time() - cpu, build=build,
+                backtracks=sol.backtracks, nodes=optimizer.NBnodes, changes=store.changes() - changes,
+                propagations=sum(r[2] for r in cobra.Profile.current.classes()) if propagations else None, # Build included
+                memory=getrusage(RUSAGE_SELF).ru_maxrss / RSSMB if getrusage else None, # MB
+                objective=sol.objvalue, solutions=sol.nsol, completion=sol.completion)
+
+def spawn(spec, timeout=None): # One run in a fresh process, None when it failed
+    command = [sys.executable] + (['-O'] if sys.flags.optimize else []) + ['-m', 'benchs.runner', '--worker', json.dumps(spec)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try: out = subprocess.run(command, cwd=root, stdout=subprocess.PIPE, timeout=None if timeout is None else 2 * timeout + 60, check=True).stdout
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired): return None
+    return json.loads(out.decode().splitlines()[-1])
+
+#------------------------------- Runner ---------------------------------------------
+
+def key(r): return r['bench'], r['size'], json.dumps(r['config'], sort_keys=True)
+
+def sweep(benchs, sizes=None, configs=None, repeat=3, timeout=None, propagations=False):
+    results = []
+    for bench in benchs:
+        model, defaultSizes, defaultConfigs = BENCHS[bench]
+        for size in (sizes or defaultSizes) if defaultSizes != [None] else [None]:
+            for config in configs or defaultConfigs:
+                spec = dict(bench=bench, size=size, config=config, timeout=timeout, propagations=propagations)
+                runs = [spawn(spec, timeout) for _ in range(repeat)]
+                results.append(summary(bench, size, config, runs))
+                print(line(results[-1]), flush=True)
+    return results
+
+def summary(bench, size, config, runs): # Medians of the times, counts of the first run
+    r = dict(bench=bench, size=size, config=config, runs=runs)
+    done = [run for run in runs if run]
+    if not done: return dict(r, failed=True)
+    r.update((k, median(run[k] for run in done)) for k in ('wall', 'cpu', 'build'))
+    r.update((k, done[0][k]) for k in ('backtracks', 'nodes', 'changes', 'propagations', 'memory', 'objective', 'solutions', 'completion'))
+    r['stable'] = all(run[k] == done[0][k] for run in done for k in COUNTS) # Deterministic search
+    r['failed'] = len(done) < len(runs)
+    return r
+
+def name(r): return " ".join(str(x) for x in (r['bench'], r['size'], json.dumps(r['config'], sort_keys=True)) if x is not None)
+
+def line(r):
+    if 'wall' not in r: return "{}: failed".format(name(r))
+    return "{}: wall={:.4f}s cpu={:.4f}s build={:.4f}s backtracks={} nodes={} changes={}{} memory={}MB objective={}{}".format(name(r), r['wall'], r['cpu'], r['build'], r['backtracks'], r['nodes'], r['changes'], "" if r.get('propagations') is None else " propagations={}".format(r['propagations']), None if r['memory'] is None else round(r['memory'], 1), r['objective'], "" if r['completion'] else " (interrupted)")
+
+def compare(results, baseline, tolerance=0.1, floor=0.01): # Regressions with respect to the baseline
+    base = {key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(key(r))
+        if not b or 'wall' not in b: continue
+        if 'wall' not in r:
+            regressions.append((r, "failed"))
+            continue
+        changed = [k for k in COUNTS if r[k] != b[k]]
+        if changed: regressions.append((r, "search changed: " + ", ".join("{} {} -> {}".format(k, b[k], r[k]) for k in changed)))
+        elif r.get('propagations') is not None and b.get('propagations') is not None and r['propagations'] > b['propagations']: # Same search, more propagation work
+            regressions.append((r, "more propagations: {} -> {} (+{:.0%})".format(b['propagations'], r['propagations'], r['propagations'] / b['propagations'] - 1)))
+        if r['cpu'] > b['cpu'] * (1 + tolerance) and r['cpu'] - b['cpu'] > floor:
+            regressions.append((r, "slower: cpu {:.4f}s -> {:.4f}s (+{:.0%})".format(b['cpu'], r['cpu'], r['cpu'] / b['cpu'] - 1)))
+    return regressions
+
+def write(results, out=None, csvOut=None):
+    if out:
+        meta = dict(date=strftime("%Y-%m-%d %H:%M:%S"), python=platform.python_version(), machine=platform.machine(), cobra=cobra.__version__, optimize=sys.flags.optimize)
+        with open(out, 'w') as f: json.dump(dict(meta=meta, results=results), f, indent=1)
+    if csvOut:
+        fields = ['bench', 'size', 'config', 'wall', 'cpu', 'build', 'backtracks', 'nodes', 'changes', 'propagations', 'memory', 'objective', 'solutions', 'completion', 'stable', 'failed']
+        with open(csvOut, 'w', newline='') as f:
+            w = csv.DictWriter(f, fields, extrasaction='ignore')
+            w.writeheader()
+            for r in results: w.writerow(dict(r, config=json.dumps(r['config'], sort_keys=True)))
+
+def main(benchs=None, sizes=None, configs=None, repeat=3, timeout=None, out=None, csvOut=None, baseline=None, tolerance=0.1, propagations=False):
+    results = sweep(benchs or list(BENCHS), sizes, configs, repeat, timeout, propagations)
+    write(results, out, csvOut)
+    if baseline:
+        with open(baseline) as f: regressions = compare(results, json.load(f)['results'], tolerance)
+        for r, reason in regressions: print("REGRESSION {}: {}".format(name(r), reason))
+        print("{} regression(s) against {}".format(len(regressions), baseline))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark Runner')
+    parser.add_argument("benchs", nargs='*', help="Benchmarks to run among {}, default=all".format(", ".join(BENCHS)), default=None)
+    parser.add_argument("-s", "--sizes", type=int, nargs='+', help="Instance sizes, default=the sizes of each benchmark", default=None)
+    parser.add_argument("-c", "--config", action='append', help="Configuration as a JSON object of model options and Optimizer settings (repeatable), default=the configurations of each benchmark", default=None)
+    parser.add_argument("-r", "--repeat", type=int, help="Runs of each configuration, default=3", default=3)
+    parser.add_argument("-t", "--timeout", help="Budget time of each run in seconds", type=float, default=None)
+    parser.add_argument("-o", "--out", help="JSON file of the results", default=None)
+    parser.add_argument("--csv", help="CSV file of the results", default=None)
+    parser.add_argument("-b", "--baseline", help="JSON file of the results to compare with", default=None)
+    parser.add_argument("--tolerance", type=float, help="Slowdown of the median cpu time reported as a regression, default=0.1", default=0.1)
+    parser.add_argument("--propagations", help="--propagations=profile the propagation and record the number of calls (slower runs)", action='store_true', default=False)
+    parser.add_argument("--worker", help="Internal: runs one configuration given as JSON and prints its measures")
+    args = parser.parse_args()
+    for b in args.benchs:
+        if b not in BENCHS: parser.error("unknown benchmark {}".format(b))
+    if args.worker:
+        spec = json.loads(args.worker)
+        print(json.dumps(measure(spec['bench'], spec['size'], spec['config'], spec['timeout'], spec.get('propagations', False))))
+        sys.exit(0)
+    sys.exit(main(args.benchs, args.sizes, [json.loads(c) for c in args.config] if args.config else None, args.repeat, args.timeout, args.out, args.csv, args.baseline, args.tolerance, args.propagations))
@@ -15,8 +15,8 @@ import cobra
 #python -O -m benchs.sched_bridge_direct_simple
 #Optimization completed, min(STSTOP)=104 in      586 backtracks (     578 for proof) and 0:0:0.257542
 
-def main(root=True, verbose=0, disjStatic=2, disjChoice=1, disjSide=0, timeout=None):
-    cobra.Logprint(verbose)
+def bridge(unary=False, search=0, network=False): # Returns the STOP interval
+    if network: cobra.temporalNetwork()
 
 # tasks
     start=cobra.Interval('Start', cobra.START, 0, cobra.HORIZON)
@@ -188,24 +188,43 @@ def main(root=True, verbose=0, disjStatic=2, disjChoice=1, disjSide=0, timeout=N
 
 # NonOverlaping constraint
     for key, tasks in Resource.items(): 
+        if unary:
+            cobra.noOverlap(tasks)
+            if search == 1: continue # SetTimes does not branch on disjunctions
         for i, t1 in enumerate(tasks[:-1]):
             for t2 in tasks[i+1:]:
                 cobra.ordering(t2.st, t2.sp, t1.st, t1.sp)
+    return stop
+
+def main(search=0, unary=False, root=True, verbose=0, disjStatic=2, disjChoice=1, disjSide=0, propagation=cobra.EAGER, jobs=0, workers=0, timeout=None, network=False, profile=False):
+    cobra.Logprint(verbose)
+    if profile: cobra.profiling()
+    stop = bridge(unary, search, network)
 
 # Solve
-    optimizer = cobra.Optimizer(stop.st, 0, mini=True, root=root, disjStatic=disjStatic, disjChoice=disjChoice, disjSide=disjSide)
-    sol = optimizer.optimize(timeout)
+    optimizer = cobra.Optimizer(stop.st, search, mini=True, root=root, disjStatic=disjStatic, disjChoice=disjChoice, disjSide=disjSide, propagation=propagation)
+    if jobs: sol = optimizer.portfolio(processes=jobs)
+    elif workers: sol = optimizer.parallel(workers)
+    else: sol = optimizer.optimize(timeout)
     print("python -O -m benchs.sched_bridge_direct -x {} -y {} -z {}".format(disjStatic, disjChoice, disjSide))
     print("Optimization {}, {} in {:>8} backtracks ({:>8} for proof) and {}".format("completed" if sol.completion else "interrupted", "min({})={}".format(sol.objname, sol.objvalue) if sol.vars else "no solution found", sol.backtracks, sol.proof, sol.duration))
     cobra.showVar(sol.vars)
+    if optimizer.profile: print(optimizer.profile)
 
 if __name__ == "__main__":
     parser = ArgumentParser(description='Bridge Benchmark')
+    parser.add_argument("-s", "--search", type=int, choices=[0, 1], help="0=disjunctive search, 1=SetTimes search", default=0)
+    parser.add_argument("-u", "--unary", help="-u=noOverlap constraint on each resource (alone with SetTimes search)", action='store_true', default=False)
     parser.add_argument("-b", "--branchANDbound", help="-b=Branch and Bound, default=Root", action='store_true', default=False)
     parser.add_argument("-v", "--verbose", type=int, choices=[0, 2, 3, 4, 5], help="0=quiet, 2=search progression, 4=constraint propagation, 5=trailing", default=0)
     parser.add_argument("-x", "--disjStatic", type=int, choices=[0, 1, 2, 3, 4], help="0=no reordering, 1=reverse declaration order, 2=earliest time first, 3=latest time first, 4=smallest proximity", default=1)
     parser.add_argument("-y", "--disjChoice", type=int, choices=[0, 1, 2, 3, 4, 5], help="0=implementation order, 1=heaviest weight first, 2=largest proximity first, 3=heaviest weight first and then earliest time, 4=latest time first, 5=smallest proximity of maximum of minimum Earliest Starting Time", default=4)
     parser.add_argument("-z", "--disjSide", type=int, choices=[0, 1, 2, 3, 4, 5, 6], help="0=declaration side, 1=highest weight first, 2=lowest weight first, 3=latest time first, 4=earliest time first, 5=latest ending time first, 6=earliest ending time first", default=0)
+    parser.add_argument("-p", "--propagation", type=int, choices=[0, 1], help="0=eager, 1=queue-based", default=0)
+    parser.add_argument("-j", "--jobs", type=int, help="Number of processes running the default portfolio of heuristics (-x, -y and -z are then ignored), default=0 (no portfolio)", default=0)
+    parser.add_argument("-w", "--workers", type=int, help="Number of processes sharing the search tree, default=0 (sequential search)", default=0)
+    parser.add_argument("-n", "--network", help="-n=precedences and decided disjunctions as edges of a single temporal network", action='store_true', default=False)
     parser.add_argument("-t", "--timeout", help="Budget time in seconds (or fractions thereof)", type=float, default=None)
+    parser.add_argument("-P", "--profile", help="-P=report of the calls of the propagators per class and per constraint", action='store_true', default=False)
     args = parser.parse_args()
-    main(root=not(args.branchANDbound), verbose=args.verbose, disjStatic=args.disjStatic, disjChoice=args.disjChoice, disjSide=args.disjSide, timeout=args.timeout)
+    main(search=args.search, unary=args.unary, root=not(args.branchANDbound), verbose=args.verbose, disjStatic=args.disjStatic, disjChoice=args.disjChoice, disjSide=args.disjSide, propagation=args.propagation, jobs=args.jobs, workers=args.workers, timeout=args.timeout, network=args.network, profile=args.profile)
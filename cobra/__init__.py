@@ -10,24 +10,25 @@ r"""COBRA: constraint-based scheduling
 __version__ = '1.0.0'
 
 __all__ = (
-'clear',
-'Optimizer', 'Solution', 'validate', 'showVar',
+'clear', 'Model',
+'Optimizer', 'Solution', 'validate', 'showVar', 'Interrupted', 'PORTFOLIO', 'ndjsonSink', 'binarySink', 'Hooks', 'Progress',
 
-'ZERO', 'UN', 'DEUX', 'START', 'MINSTART', 'HORIZON', 'TRUE', 'FALSE', 'UNKNOWN', 'FAIL', 'Var', 'Constraint', 'MetaConstraint', 'UnConstraint', 'ArithmConstraint', 'supxc', 'infxc', 'equxc', 'nequxc', 'nequxyc', 'supxyc', 'infxyc', 'strictsupxyc', 'strictinfxyc', 'equxyc', 'equxyzc', 'Supxc', 'Infxc', 'Equxc', 'Nequxc', 'Nequxyc', 'Supxyc', 'Infxyc', 'Equxyc', 'Equxyzc', 'Logprint',
+'ZERO', 'UN', 'DEUX', 'START', 'MINSTART', 'HORIZON', 'TRUE', 'FALSE', 'UNKNOWN', 'FAIL', 'Var', 'BitVar', 'Constraint', 'MetaConstraint', 'UnConstraint', 'ArithmConstraint', 'supxc', 'infxc', 'equxc', 'nequxc', 'nequxyc', 'supxyc', 'infxyc', 'strictsupxyc', 'strictinfxyc', 'equxyc', 'equxyzc', 'allDifferent', 'temporalNetwork', 'batch', 'variables', 'differences', 'Supxc', 'Infxc', 'Equxc', 'Nequxc', 'Nequxyc', 'Supxyc', 'Infxyc', 'Equxyc', 'Equxyzc', 'AllDifferent', 'TemporalNetwork', 'Batch', 'Logprint', 'EAGER', 'QUEUE', 'INCMIN', 'DECMAX', 'SETVAL', 'Propagation', 'Agenda', 'INF', 'SUP', 'snapshot', 'profiling', 'Profile',
 
-'Interval', 'startBeforeEnd', 'startBeforeStart', 'endBeforeEnd', 'endBeforeStart', 'startAtEnd', 'startAtStart', 'endAtEnd', 'endAtStart',
+'Interval', 'noOverlap', 'NoOverlap', 'cumulative', 'Cumulative', 'startBeforeEnd', 'startBeforeStart', 'endBeforeEnd', 'endBeforeStart', 'startAtEnd', 'startAtStart', 'endAtEnd', 'endAtStart', 'precedences',
 
 'disjunction', 'ordering', 'Disjunction'
 )
 
 __author__ = 'Pierre Savéant <pierre.saveant@thalesgroup.com>'
 
-from .solver import Optimizer, Solution, validate, showVar
-from .filter import ZERO, UN, DEUX, START, HORIZON, TRUE, FALSE, UNKNOWN, FAIL, Var, Constraint, MetaConstraint, UnConstraint, ArithmConstraint, supxc, infxc, equxc, nequxc, nequxyc, supxyc, infxyc, strictsupxyc, strictinfxyc, equxyc, equxyzc, Supxc, Infxc, Equxc, Nequxc, Nequxyc, Supxyc, Infxyc, Equxyc, Equxyzc, Logprint
+from .solver import Optimizer, Solution, validate, showVar, Interrupted, PORTFOLIO, ndjsonSink, binarySink, Hooks, Progress
+from .filter import ZERO, UN, DEUX, START, HORIZON, TRUE, FALSE, UNKNOWN, FAIL, Var, BitVar, Constraint, MetaConstraint, UnConstraint, ArithmConstraint, supxc, infxc, equxc, nequxc, nequxyc, supxyc, infxyc, strictsupxyc, strictinfxyc, equxyc, equxyzc, allDifferent, temporalNetwork, batch, variables, differences, Supxc, Infxc, Equxc, Nequxc, Nequxyc, Supxyc, Infxyc, Equxyc, Equxyzc, AllDifferent, TemporalNetwork, Batch, Logprint, EAGER, QUEUE, INCMIN, DECMAX, SETVAL, Propagation, Agenda, INF, SUP, snapshot, profiling, Profile
 
-from .interval import Interval, startBeforeEnd, startBeforeStart, endBeforeEnd, endBeforeStart, startAtEnd, startAtStart, endAtEnd, endAtStart
+from .interval import Interval, noOverlap, NoOverlap, cumulative, Cumulative, startBeforeEnd, startBeforeStart, endBeforeEnd, endBeforeStart, startAtEnd, startAtStart, endAtEnd, endAtStart, precedences
 
 from .bool import disjunction, ordering, Disjunction
+from .model import Model
 import store
 
 def clear():
@@ -9,17 +9,19 @@ import store
 from . import filter
 from .filter import Logprint
 
-__all__ = ('disjunction', 'ordering', 'Disjunction', 'clear')
+__all__ = ('disjunction', 'ordering', 'Disjunction', 'clear', 'getState', 'setState')
 
 def clear():
     Disjunction.instances=[]
-    Guard.instances=[]
-    Conjunction.instances=[]
-    DisjunctionInc.instances=[]
+
+def getState(): return Disjunction.instances
+
+def setState(state=None):
+    Disjunction.instances = [] if state is None else state
 
 #------------------------- Exclusive Disjunction ---------------------------#
 def disjunction(c1, c2): # c1 xor c2
-    d = Disjunction(c1, c2); d.link(d, 0); d.tell()
+    d = Disjunction(c1, c2); d.link(d, 0); filter.post(d)
     return d
 
 def ordering(v1, d1, v2, d2): # (v2 + d2 <= v1) or (v1 + d1 <= v2) 
@@ -76,12 +78,14 @@ class Disjunction(filter.MetaConstraint):
             if b != filter.UNKNOWN:
                 if b == filter.FALSE:
                     self.const[0].setVal(i)
+                    self.entailed(0)
             else: self.checkLeft()
         else:
             b = self.left
             if b != filter.UNKNOWN:
                 if b == filter.FALSE:
                     self.const[1].setVal(i-self.offset)
+                    self.entailed(1)
             else: self.checkRight()
 
     def ask(self):
@@ -108,11 +112,12 @@ class Disjunction(filter.MetaConstraint):
                     if self.right == filter.FALSE: raise FAIL("*** FAIL on {0} ***".format(self))
                     else:
                         store.assign(self, 'right', filter.TRUE)
-                        self.const[1].tell() # Constructive disjunction
                         store.assign(self, 'active', filter.FALSE)
+                        self.decide(1) # Constructive disjunction
                 else:
                     store.assign(self, 'right', filter.FALSE)
                     store.assign(self, 'active', filter.FALSE)
+                    self.deactivate()
 
     def checkRight(self):
         assert(Logprint.logPrint(4, "==>checkRight on {!s}".format(self))==None)
@@ -124,11 +129,12 @@ class Disjunction(filter.MetaConstraint):
                     if self.left == filter.FALSE: raise FAIL("*** FAIL on {0} ***".format(self))
                     else:
                         store.assign(self, 'left', filter.TRUE)
-                        self.const[0].tell() # Constructive disjunction
                         store.assign(self, 'active', filter.FALSE)
+                        self.decide(0) # Constructive disjunction
                 else:
                     store.assign(self, 'left', filter.FALSE)
                     store.assign(self, 'active', filter.FALSE)
+                    self.deactivate()
 
     def settled(self, b):
         assert(Logprint.logPrint(4, "settled: {!s} {!s}".format(self, b))==None)
@@ -136,12 +142,28 @@ class Disjunction(filter.MetaConstraint):
             store.assign(self, 'left', filter.TRUE) # try const1
             store.assign(self, 'right', filter.FALSE)
             store.assign(self, 'active', filter.FALSE)
-            self.const[0].tell()
+            self.decide(0)
         else:
             store.assign(self, 'left', filter.FALSE) # try const2
             store.assign(self, 'right', filter.TRUE)
             store.assign(self, 'active', filter.FALSE)
-            self.const[1].tell()
+            self.decide(1)
+
+    def decide(self, k): # Enforces the side k, as an edge of the temporal network if any
+        c = self.const[k]
+        network = filter.TemporalNetwork.current
+        if network and type(c) in (filter.Supxyc, filter.Infxyc, filter.Equxyc):
+            self.deactivate()
+            network.post(c)
+        else:
+            c.tell()
+            self.entailed(k)
+
+    def entailed(self, k): # The side kept is entailed: nothing left to propagate
+        if self.const[k].ask() == filter.TRUE: self.deactivate()
+
+    def isEntailed(self): # ask() is TRUE once a side is decided, which is not enough
+        return self.const[0].ask() == filter.TRUE or self.const[1].ask() == filter.TRUE
 
     def computeWeight(self): return self.const[0].computeWeight() + self.const[1].computeWeight()
 
@@ -5,10 +5,14 @@
 # This software is released as Open Source under the terms of a 3-clause BSD license #
 #------------------------------------------------------------------------------------#
 
+from array import array
+from collections import deque
+from time import perf_counter
 import store
+from store.store import Track
 
 #------------------------------- API --------------------------------------#
-__all__ = ('clear', 'ZERO', 'UN', 'DEUX', 'START', 'MINSTART', 'HORIZON', 'TRUE', 'FALSE', 'UNKNOWN', 'FAIL', 'Var', 'Constraint', 'MetaConstraint', 'UnConstraint', 'ArithmConstraint', 'supxc', 'infxc', 'equxc', 'nequxc', 'nequxyc', 'supxyc', 'infxyc', 'strictsupxyc', 'strictinfxyc', 'equxyc', 'equxyzc', 'Supxc', 'Infxc', 'Equxc', 'Nequxc', 'Nequxyc', 'Supxyc', 'Infxyc', 'Equxyc', 'Equxyzc', 'Logprint')
+__all__ = ('clear', 'getState', 'setState', 'ZERO', 'UN', 'DEUX', 'START', 'MINSTART', 'HORIZON', 'TRUE', 'FALSE', 'UNKNOWN', 'FAIL', 'Var', 'BitVar', 'Constraint', 'MetaConstraint', 'UnConstraint', 'ArithmConstraint', 'supxc', 'infxc', 'equxc', 'nequxc', 'nequxyc', 'supxyc', 'infxyc', 'strictsupxyc', 'strictinfxyc', 'equxyc', 'equxyzc', 'allDifferent', 'temporalNetwork', 'batch', 'variables', 'differences', 'Supxc', 'Infxc', 'Equxc', 'Nequxc', 'Nequxyc', 'Supxyc', 'Infxyc', 'Equxyc', 'Equxyzc', 'AllDifferent', 'TemporalNetwork', 'Batch', 'Logprint', 'EAGER', 'QUEUE', 'INCMIN', 'DECMAX', 'SETVAL', 'Propagation', 'Agenda', 'INF', 'SUP', 'snapshot', 'profiling', 'Profile')
 
 #---------------------------- Constants -----------------------------------#
 ZERO=0
@@ -20,34 +24,48 @@ MINSTART=-1
 HORIZON=1000000
 
 FALSE, TRUE, UNKNOWN = range(3)
+
+EAGER, QUEUE = range(2) # Propagation modes
+INCMIN, DECMAX, SETVAL = 1, 2, 4 # Events pending in the agenda
 #------------------------------ Closing -----------------------------------#
 def clear():
     for v in Var.instances:
-        v.constraints=None
+        v.constraints = v.mins = v.maxs = None
     Var.instances=[]
+    TemporalNetwork.current = None
+    Batch.current = None
+    del INF[:]
+    del SUP[:]
+
+def getState(): # Domains and registries in use, to be set back by setState()
+    return INF[:], SUP[:], Var.instances, TemporalNetwork.current, Propagation.agenda, Batch.current
+
+def setState(state=None): # Switches to the given domains and registries, or to empty ones
+    if state is None: state = array('l'), array('l'), [], None, None, None
+    INF[:], SUP[:], Var.instances, TemporalNetwork.current, Propagation.agenda, Batch.current = state
 
 #---------------------------- Constraints -----------------------------------#
 
 def supxc(v, cste=ZERO): # v >= cste
-    c = Supxc(v, cste); c.tell(); return c
+    c = Supxc(v, cste); post(c); return c
 
 def infxc(v, cste=ZERO): # v <= cste
-    c = Infxc(v, cste); c.tell(); return c
+    c = Infxc(v, cste); post(c); return c
 
 def equxc(v, cste=ZERO): # v == cste
-    c = Equxc(v, cste); c.tell(); return c
+    c = Equxc(v, cste); post(c); return c
 
 def nequxc(v, cste=ZERO): # v != cste
-    c = Nequxc(v, cste); c.link(); c.tell(); return c
+    c = Nequxc(v, cste); c.link(); post(c); return c
 
 def nequxyc(u, v, cste=ZERO): # u != v + cste
-    c = Nequxyc(u, v, cste); c.link(); c.tell(); return c
+    c = Nequxyc(u, v, cste); c.link(); post(c); return c
 
 def supxyc(u, v, cste=ZERO): # u >= v + cste
-    c = Supxyc(u, v, cste); c.link(); c.tell(); return c
+    c = Supxyc(u, v, cste); difference(c); return c
 
 def infxyc(u, v, cste=ZERO): # u <= v + cste
-    c = Infxyc(u, v, cste); c.link(); c.tell(); return c
+    c = Infxyc(u, v, cste); difference(c); return c
 
 def strictsupxyc(u, v, cste=ZERO): # u > v + cste
     return supxyc(u, v, cste + UN)
@@ -56,80 +74,293 @@ def strictinfxyc(u, v, cste=ZERO): # u < v + cste
     return supxyc(v, u, -cste + UN)
 
 def equxyc(u, v, cste=ZERO): # u == v + cste
-    c = Equxyc(u, v, cste); c.link(); c.tell(); return c
+    c = Equxyc(u, v, cste); difference(c); return c
 
 def equxyzc(u, v, w, cste=ZERO): # u + v == w + cste
-    c = Equxyzc(u, v, w, cste); c.link(); c.tell(); return c
+    c = Equxyzc(u, v, w, cste); c.link(); post(c); return c
+
+def allDifferent(vars, offsets=None): # vars[i] + offsets[i] pairwise different
+    c = AllDifferent(vars, offsets); c.link(); post(c); return c
+
+def temporalNetwork(): # The difference constraints posted from now on are edges of a single network
+    c = TemporalNetwork(); TemporalNetwork.current = c; return c
+
+def difference(c): # Into the current network, else on its own
+    if TemporalNetwork.current: TemporalNetwork.current.post(c)
+    else:
+        c.link()
+        post(c)
+
+def post(c): # Propagates c, at once or at the close of the current batch
+    if Batch.current: Batch.current.posted.append(c)
+    else: c.tell()
+
+#------------------------------ Bulk construction -------------------------#
+# Within a batch the constraints are linked but not propagated: close() (or the end of a
+# with statement) runs a single fixpoint over all of them, on an agenda, instead of a
+# propagation wave per constraint. A batch opened within another one joins it.
+# The bulk helpers take lists or arrays (e.g. NumPy) and make a batch of their own
+# when none is open.
+
+def batch(): # The constraints posted from now on are propagated at close()
+    return Batch()
+
+def variables(names, inf=START, sup=HORIZON): # A Var per name, inf and sup are numbers or sequences
+    n = len(names)
+    return [Var(name, a, b) for name, a, b in zip(names, column(inf, n), column(sup, n))]
+
+def differences(vars, triples): # succ >= pred + lag for each (pred, succ, lag), indexes in vars
+    with batch():
+        for a, b, c in rows(triples): supxyc(vars[b], vars[a], c)
+
+def column(x, n): # x as a list of n numbers, x is a number or a sequence
+    if hasattr(x, 'tolist'): x = x.tolist()
+    return list(x) if hasattr(x, '__len__') else [x] * n
+
+def rows(x): return x.tolist() if hasattr(x, 'tolist') else x
 
 #------------------------------ Exception ---------------------------------#
 class FAIL(Exception): pass
 
+#---------------------------- Domain store --------------------------------#
+# The bounds of all the variables are held in two contiguous buffers
+# indexed by the variable id, so that a whole state is a buffer copy.
+
+INF = array('l') # stored
+SUP = array('l') # stored
+INFS = Track(INF) # trail of the lower bounds
+SUPS = Track(SUP) # trail of the upper bounds
+
+def snapshot(): return INF[:], SUP[:]
+
 #---------------------------- Variables -----------------------------------#
-class Var:
+class Var: # Handle over the domain store
+    __slots__ = ('id', 'name', 'constraints', 'mins', 'maxs', 'nCons', 'nMins', 'nMaxs')
     instances = []
     def __init__(self, name, inf=START, sup=HORIZON, constraints=[]):
         assert inf <= sup
+        self.id = len(INF)
         self.name = name
-        self.inf = inf # stored
-        self.sup = sup # stored
-        self.constraints = constraints[:]
+        INF.append(inf)
+        SUP.append(sup)
+        self.constraints = [] # All the registrations, woken when fixed
+        self.mins = [] # Registrations woken when the lower bound increases
+        self.maxs = [] # Registrations woken when the upper bound decreases
+        self.nCons = self.nMins = self.nMaxs = 0 # Active registrations first (stored)
+        for w in constraints: self.watch(w)
         self.instances.append(self)
 
-    def __str__(self): return self.name+":["+str(self.inf)+", "+str(self.sup)+"]"
+    inf = property(lambda self: INF[self.id])
+    sup = property(lambda self: SUP[self.id])
+
+    def __str__(self): return self.name+":["+str(INF[self.id])+", "+str(SUP[self.id])+"]"
 
-    def canBeEq(self, x, z=ZERO): return self.inf + z <= x.sup and self.sup + z >= x.inf
-    def isIt(self, x): return self.inf == self.sup and self.inf == x
-    def canBe(self, x): return self.inf <= x and self.sup >= x
-    def canNotBe(self, x): return self.inf > x or self.sup < x
-    def isItMore(self, x): return self.inf >= x
-    def isItLess(self, x): return self.sup <= x
-    def canBeLess(self, x): return self.inf <= x
-    def canNotBeLess(self, x): return self.inf > x
-    def canBeMore(self, x): return self.sup >= x
-    def canNotBeMore(self, x): return self.sup < x
+    def canBeEq(self, x, z=ZERO): return INF[self.id] + z <= SUP[x.id] and SUP[self.id] + z >= INF[x.id]
+    def isIt(self, x): return INF[self.id] == SUP[self.id] and INF[self.id] == x
+    def canBe(self, x): return INF[self.id] <= x and SUP[self.id] >= x
+    def canNotBe(self, x): return INF[self.id] > x or SUP[self.id] < x
+    def isItMore(self, x): return INF[self.id] >= x
+    def isItLess(self, x): return SUP[self.id] <= x
+    def canBeLess(self, x): return INF[self.id] <= x
+    def canNotBeLess(self, x): return INF[self.id] > x
+    def canBeMore(self, x): return SUP[self.id] >= x
+    def canNotBeMore(self, x): return SUP[self.id] < x
 
     def isGE(self, x):
         assert(Logprint.logPrint(4, "==>{} isGE than {}".format(self, x))==None)
-        if x > self.inf:
-            if x > self.sup:
+        i = self.id
+        if x > INF[i]:
+            if x > SUP[i]:
                 raise FAIL("*** FAIL on {} is more than {} ***".format(self, x))
             else:
-                store.assign(self, 'inf', x)
-                if self.inf == self.sup:
-                    for c in self.constraints: c[0].setVal(c[1])
+                INFS.assign(i, x)
+                if Propagation.agenda:
+                    if x == SUP[i]: Propagation.agenda.schedule(self.constraints[:self.nCons], SETVAL)
+                    else: Propagation.agenda.schedule(self.mins[:self.nMins], INCMIN)
+                elif x == SUP[i]:
+                    for c in self.constraints[:self.nCons]: c[0].setVal(c[1])
                 else: 
-                    for c in self.constraints: c[0].incMin(c[1])
+                    for c in self.mins[:self.nMins]: c[0].incMin(c[1])
 
     def isLE(self, x):
         assert(Logprint.logPrint(4, "==>{} isLE than {}".format(self, x))==None)
-        if x < self.sup:
-            if x < self.inf:
+        i = self.id
+        if x < SUP[i]:
+            if x < INF[i]:
                 raise FAIL("*** FAIL on {} is less than {} ***".format(self, x))
             else:
-                store.assign(self, 'sup', x)
-                if self.inf == self.sup:
-                    for c in self.constraints: c[0].setVal(c[1])
+                SUPS.assign(i, x)
+                if Propagation.agenda:
+                    if x == INF[i]: Propagation.agenda.schedule(self.constraints[:self.nCons], SETVAL)
+                    else: Propagation.agenda.schedule(self.maxs[:self.nMaxs], DECMAX)
+                elif x == INF[i]:
+                    for c in self.constraints[:self.nCons]: c[0].setVal(c[1])
                 else:
-                    for c in self.constraints: c[0].decMax(c[1])
+                    for c in self.maxs[:self.nMaxs]: c[0].decMax(c[1])
 
     def isEQ(self, x):
         assert(Logprint.logPrint(4, "==>{} is {}".format(self, x))==None)
-        if self.inf > x or self.sup < x: 
+        i = self.id
+        if INF[i] > x or SUP[i] < x: 
             raise FAIL("*** FAIL on {} is {} ***".format(self, x))
-        elif self.inf != self.sup:
-            store.assign(self, 'inf', x)
-            store.assign(self, 'sup', x)
-            for c in self.constraints: c[0].setVal(c[1])
+        elif INF[i] != SUP[i]:
+            INFS.assign(i, x)
+            SUPS.assign(i, x)
+            if Propagation.agenda: Propagation.agenda.schedule(self.constraints[:self.nCons], SETVAL)
+            else:
+                for c in self.constraints[:self.nCons]: c[0].setVal(c[1])
 
     def isNEQ(self, x):
         assert(Logprint.logPrint(4, "==>{} is {}".format(self, x))==None)
-        if self.inf == x:
+        i = self.id
+        if INF[i] == x:
             self.isGE(x + UN)
-        elif self.sup == x:
+        elif SUP[i] == x:
             self.isLE(x - UN)
 
+    def watch(self, w, events=INCMIN|DECMAX): # Registers w = [constraint, index, 0] for the events
+        w.extend((-1, -1, -1)) # Positions of w in constraints, mins and maxs
+        self.nCons = swapIn(self.constraints, w, 3, self.nCons)
+        if events & INCMIN: self.nMins = swapIn(self.mins, w, 4, self.nMins)
+        if events & DECMAX: self.nMaxs = swapIn(self.maxs, w, 5, self.nMaxs)
+        c = w[0]
+        if not c.watchers: c.watchers = []
+        c.watchers.append((self, w))
+
+    def unwatch(self, w): # Moves w out of the active registrations
+        swapOut(self.constraints, w, 3, self.nCons)
+        self.nCons -= 1
+        if w[4] >= 0:
+            swapOut(self.mins, w, 4, self.nMins)
+            self.nMins -= 1
+        if w[5] >= 0:
+            swapOut(self.maxs, w, 5, self.nMaxs)
+            self.nMaxs -= 1
+
+    def forget(self, w): # Removes the active registration w for good
+        self.nCons = drop(self.constraints, w, 3, self.nCons)
+        if w[4] >= 0: self.nMins = drop(self.mins, w, 4, self.nMins)
+        if w[5] >= 0: self.nMaxs = drop(self.maxs, w, 5, self.nMaxs)
+
+    def rewatch(self, w): # Puts back the last registration moved out
+        self.nCons += 1
+        if w[4] >= 0: self.nMins += 1
+        if w[5] >= 0: self.nMaxs += 1
+
+    def size(self): return SUP[self.id] - INF[self.id] + 1
+
+    def values(self): return range(INF[self.id], SUP[self.id] + 1)
+
+# A watch list holds its n active registrations first. A registration is deactivated by
+# swapping it with the last active one and decrementing n. Backtracking increments n in the
+# reverse order: the registrations moved out are active again, whatever their order.
+# The position of a registration in each list is kept in the registration.
+
+def swapIn(seq, w, p, n): # Adds w as the last active registration, returns the new count
+    seq.insert(n, w) # The inactive ones keep their order
+    for k in range(n, len(seq)): seq[k][p] = k
+    return n + 1
+
+def swapOut(seq, w, p, n): # Moves w after the last active registration
+    swap(seq, w[p], n - 1, p)
+
+def drop(seq, w, p, n): # Removes the active registration w, returns the new count
+    assert(w[p] < n)
+    del seq[w[p]] # The inactive ones keep their order
+    for k in range(w[p], len(seq)): seq[k][p] = k
+    return n - 1
+
+def swap(seq, j, k, p):
+    a, b = seq[j], seq[k]
+    seq[j], seq[k] = b, a
+    b[p], a[p] = j, k
+
+#---------------------------- Bitset variables ----------------------------#
+# A BitVar also holds the values of its range as the bits of an integer (stored),
+# bit k for the value base + k. The bounds stay in the domain store and are always
+# values of the domain: isGE and isLE move them over the holes, so the constraints
+# see the same events, and isNEQ removes an inner value without any event.
+
+class BitVar(Var): # Small domain with holes
+    __slots__ = ('base', 'bits')
+    def __init__(self, name, inf=START, sup=HORIZON, constraints=[]):
+        Var.__init__(self, name, inf, sup, constraints)
+        self.base = inf
+        self.bits = (1 << (sup - inf + 1)) - 1
+
+    def __str__(self):
+        if self.size() == SUP[self.id] - INF[self.id] + 1: return Var.__str__(self)
+        return self.name+":{"+", ".join(map(str, self.values()))+"}"
+
+    def canBe(self, x): return INF[self.id] <= x <= SUP[self.id] and self.bits >> (x - self.base) & 1 == 1
+    def canNotBe(self, x): return not self.canBe(x)
+
+    def isGE(self, x):
+        i = self.id
+        if INF[i] < x <= SUP[i]:
+            above = self.bits >> (x - self.base) << (x - self.base)
+            x = self.base + (above & -above).bit_length() - 1 if above else SUP[i] + UN # Next value
+        Var.isGE(self, x)
+
+    def isLE(self, x):
+        i = self.id
+        if INF[i] <= x < SUP[i]:
+            below = self.bits & ((2 << (x - self.base)) - 1)
+            x = self.base + below.bit_length() - 1 if below else INF[i] - UN # Previous value
+        Var.isLE(self, x)
+
+    def isEQ(self, x):
+        if not self.canBe(x): raise FAIL("*** FAIL on {} is {} ***".format(self, x))
+        Var.isEQ(self, x)
+
+    def isNEQ(self, x):
+        assert(Logprint.logPrint(4, "==>{} is not {}".format(self, x))==None)
+        i = self.id
+        if INF[i] == x:
+            self.isGE(x + UN)
+        elif SUP[i] == x:
+            self.isLE(x - UN)
+        elif self.canBe(x):
+            store.assign(self, 'bits', self.bits & ~(1 << (x - self.base)))
+
+    def size(self):
+        i = self.id
+        return bin(self.bits >> (INF[i] - self.base) & ((1 << (SUP[i] - INF[i] + 1)) - 1)).count('1')
+
+    def values(self):
+        i = self.id
+        return [v for v in range(INF[i], SUP[i] + 1) if self.bits >> (v - self.base) & 1]
+
 #----------------------------- Constraints --------------------------------#
-class Constraint: pass
+# Each variable holds its registrations as [constraint, index, pending events].
+# A registration is woken by incMin and decMax only for the events it watches,
+# and by setVal in any case.
+# An entailed constraint cannot filter any more: deactivate() removes its registrations
+# until backtrack. The wakeups run over a copy of the active registrations, which
+# a deactivation reorders.
+
+class Constraint:
+    priority = 0 # Agenda level, cheap propagators first
+    watchers = () # (variable, registration) pairs, none inside a metaconstraint
+
+    def deactivate(self): # Entailed, a single record on the trail
+        if not self.watchers: return
+        v, w = self.watchers[0]
+        if w[3] >= v.nCons: return # Already inactive
+        assert(Logprint.logPrint(4, "==>Deactivate {!s}".format(self))==None)
+        for v, w in self.watchers: v.unwatch(w)
+        store.record(Constraint.reactivate, self)
+
+    def reactivate(self, att, value):
+        for v, w in reversed(self.watchers): v.rewatch(w)
+
+    def detach(self): # Never told (batch left on an error): its registrations and instance are removed
+        for v, w in reversed(self.watchers): v.forget(w)
+        self.watchers = ()
+        if self in getattr(self, 'instances', ()): self.instances.remove(self)
+
+    def isEntailed(self): # Satisfied by any values of the domains
+        return self.ask() == TRUE
 
 class MetaConstraint(Constraint):
 
@@ -138,10 +369,10 @@ class MetaConstraint(Constraint):
         if issubclass(type(c), ArithmConstraint):
             for v in c.lv:
                 j += 1
-                v.constraints.append((self, j))
+                v.watch([self, j, 0])
         elif issubclass(type(c), UnConstraint):
             j += 1
-            c.v.constraints.append((self, j))
+            c.v.watch([self, j, 0])
         else: # Metaconstraint
             j = self.link(c.const[0], j)
             c.offset = j - i
@@ -158,13 +389,15 @@ class UnConstraint(Constraint):
 
 
 class ArithmConstraint(Constraint):
+    watches = None # Events watched on each variable (all by default)
     def __init__(self, *lv, c=ZERO, d=ZERO):
         self.lv = lv
         self.c = c
         self.d = d
 
     def link(self):
-        for i in range(len(self.lv)): self.lv[i].constraints.append((self, i+1))
+        watches = self.watches or (INCMIN|DECMAX,) * len(self.lv)
+        for i in range(len(self.lv)): self.lv[i].watch([self, i+1, 0], watches[i])
 
     def computeWeight(self): return abs(self.c)
     def computeProximity(self): return abs(self.c)
@@ -190,7 +423,7 @@ class Supxc(UnConstraint):
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
-        if self.v.inf >= self.c: return TRUE
+        if INF[self.v.id] >= self.c: return TRUE
         elif self.v.canNotBeMore(self.c): return FALSE
         else: return UNKNOWN
 
@@ -219,7 +452,7 @@ class Infxc(UnConstraint):
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
-        if self.v.sup <= self.c: return TRUE
+        if SUP[self.v.id] <= self.c: return TRUE
         elif self.v.canNotBeLess(self.c): return FALSE
         else: return UNKNOWN
 
@@ -262,7 +495,7 @@ class Nequxc(UnConstraint):
         UnConstraint.__init__(self, v, c=c)
 
     def link(self):
-        self.v.constraints.append((self, 1))
+        self.v.watch([self, 1, 0])
 
     def __str__(self): return "{} != {}".format(self.v.name, self.c)
 
@@ -276,7 +509,7 @@ class Nequxc(UnConstraint):
 
     def setVal(self, i):
         assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
-        if self.v.inf == self.c: raise FAIL("*** FAIL on {} ***".format(self))
+        if INF[self.v.id] == self.c: raise FAIL("*** FAIL on {} ***".format(self))
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
@@ -297,32 +530,36 @@ class Nequxyc(ArithmConstraint):
 
     def incMin(self, i):
         assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
-        if self.lv[0].inf == self.lv[0].sup: self.lv[1].isNEQ(self.lv[0].inf - self.c)
-        elif self.lv[1].inf == self.lv[1].sup: self.lv[0].isNEQ(self.lv[1].inf + self.c)
+        u, v = self.lv
+        x = INF[u.id]
+        if x == SUP[u.id]: v.isNEQ(x - self.c)
+        else:
+            y = INF[v.id]
+            if y == SUP[v.id]: u.isNEQ(y + self.c)
 
     def decMax(self, i):
         assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
-        if self.lv[0].inf == self.lv[0].sup: self.lv[1].isNEQ(self.lv[0].inf - self.c)
-        elif self.lv[1].inf == self.lv[1].sup: self.lv[0].isNEQ(self.lv[1].inf + self.c)
+        self.incMin(i)
 
     def setVal(self, i):
         assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
-        if i==1: self.lv[1].isNEQ(self.lv[0].inf - self.c)
-        else: self.lv[0].isNEQ(self.lv[1].inf + self.c)
+        if i==1: self.lv[1].isNEQ(INF[self.lv[0].id] - self.c)
+        else: self.lv[0].isNEQ(INF[self.lv[1].id] + self.c)
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
-        if self.lv[0].sup < self.lv[1].inf + self.c or self.lv[1].sup < self.lv[0].inf - self.c: return TRUE
-        elif self.lv[0].inf == self.lv[0].sup and self.lv[1].inf == self.lv[1].sup and self.lv[0].inf == self.lv[1].inf + self.c: return FALSE
+        u, v = self.lv[0].id, self.lv[1].id
+        if SUP[u] < INF[v] + self.c or SUP[v] < INF[u] - self.c: return TRUE
+        elif INF[u] == SUP[u] and INF[v] == SUP[v] and INF[u] == INF[v] + self.c: return FALSE
         else: return UNKNOWN
 
     def tell(self):
         assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
-        if self.lv[0].inf == self.lv[0].sup: self.lv[1].isNEQ(self.lv[0].inf - self.c)
-        elif self.lv[1].inf == self.lv[1].sup: self.lv[0].isNEQ(self.lv[1].inf + self.c)
+        self.incMin(1)
 
 #----------------------- U >= V + c ---------------------------------------#
 class Supxyc(ArithmConstraint):
+    watches = (DECMAX, INCMIN) # max(U) bounds V, min(V) bounds U
     def __init__(self, u, v, c=ZERO):
         ArithmConstraint.__init__(self, u, v, c=c)
 
@@ -330,32 +567,33 @@ class Supxyc(ArithmConstraint):
 
     def incMin(self, i):
         assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
-        if i==2: self.lv[0].isGE(self.lv[1].inf + self.c)
+        if i==2: self.lv[0].isGE(INF[self.lv[1].id] + self.c)
 
     def decMax(self, i):
         assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
-        if i==1: self.lv[1].isLE(self.lv[0].sup - self.c)
+        if i==1: self.lv[1].isLE(SUP[self.lv[0].id] - self.c)
 
     def setVal(self, i):
         assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
-        self.lv[1].isLE(self.lv[0].inf - self.c) if i==1 else self.lv[0].isGE(self.lv[1].inf + self.c)
+        self.lv[1].isLE(INF[self.lv[0].id] - self.c) if i==1 else self.lv[0].isGE(INF[self.lv[1].id] + self.c)
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
-        if self.lv[0].sup < self.lv[1].inf + self.c: return FALSE
-        elif self.lv[0].inf >= self.lv[1].sup + self.c: return TRUE
+        if SUP[self.lv[0].id] < INF[self.lv[1].id] + self.c: return FALSE
+        elif INF[self.lv[0].id] >= SUP[self.lv[1].id] + self.c: return TRUE
         else: return UNKNOWN
 
     def tell(self):
         assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
-        self.lv[0].isGE(self.lv[1].inf + self.c)
-        self.lv[1].isLE(self.lv[0].sup - self.c)
+        self.lv[0].isGE(INF[self.lv[1].id] + self.c)
+        self.lv[1].isLE(SUP[self.lv[0].id] - self.c)
 
     def computeProximity(self):
-        return abs(self.lv[0].inf - self.lv[1].inf)
+        return abs(INF[self.lv[0].id] - INF[self.lv[1].id])
 
 #----------------------- U <= V + c ---------------------------------------#
 class Infxyc(ArithmConstraint):
+    watches = (INCMIN, DECMAX) # min(U) bounds V, max(V) bounds U
     def __init__(self, u, v, c=ZERO):
         ArithmConstraint.__init__(self, u, v, c=c)
 
@@ -363,28 +601,28 @@ class Infxyc(ArithmConstraint):
 
     def incMin(self, i):
         assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
-        if i==1: self.lv[1].isGE(self.lv[0].inf - self.c)
+        if i==1: self.lv[1].isGE(INF[self.lv[0].id] - self.c)
 
     def decMax(self, i):
         assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
-        if i==2: self.lv[0].isLE(self.lv[1].sup + self.c)
+        if i==2: self.lv[0].isLE(SUP[self.lv[1].id] + self.c)
 
 
     def setVal(self, i):
         assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
-        self.lv[1].isGE(self.lv[0].inf - self.c) if i==1 else self.lv[0].isLE(self.lv[1].sup + self.c)
+        self.lv[1].isGE(INF[self.lv[0].id] - self.c) if i==1 else self.lv[0].isLE(SUP[self.lv[1].id] + self.c)
 
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
-        if self.lv[1].inf >= self.lv[0].sup + self.c: return TRUE
-        elif self.lv[1].sup < self.lv[0].inf + self.c : return FALSE
+        if SUP[self.lv[0].id] <= INF[self.lv[1].id] + self.c: return TRUE
+        elif INF[self.lv[0].id] > SUP[self.lv[1].id] + self.c: return FALSE
         else: return UNKNOWN
 
     def tell(self):
         assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
-        self.lv[0].isLE(self.lv[1].sup + self.c)
-        self.lv[1].isGE(self.lv[0].inf - self.c)
+        self.lv[0].isLE(SUP[self.lv[1].id] + self.c)
+        self.lv[1].isGE(INF[self.lv[0].id] - self.c)
 
 #----------------------- U == V + c ---------------------------------------#
 class Equxyc(ArithmConstraint):
@@ -395,20 +633,20 @@ class Equxyc(ArithmConstraint):
 
     def incMin(self, i):
         assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
-        self.lv[1].isGE(self.lv[0].inf - self.c) if i==1 else self.lv[0].isGE(self.lv[1].inf + self.c)
+        self.lv[1].isGE(INF[self.lv[0].id] - self.c) if i==1 else self.lv[0].isGE(INF[self.lv[1].id] + self.c)
 
     def decMax(self, i):
         assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
-        self.lv[1].isLE(self.lv[0].sup - self.c) if i==1 else self.lv[0].isLE(self.lv[1].sup + self.c)
+        self.lv[1].isLE(SUP[self.lv[0].id] - self.c) if i==1 else self.lv[0].isLE(SUP[self.lv[1].id] + self.c)
 
     def setVal(self, i):
         assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
-        self.lv[1].isEQ(self.lv[0].inf - self.c) if i==1 else self.lv[0].isEQ(self.lv[1].inf + self.c)
+        self.lv[1].isEQ(INF[self.lv[0].id] - self.c) if i==1 else self.lv[0].isEQ(INF[self.lv[1].id] + self.c)
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
-        if self.lv[0].sup < self.lv[1].inf + self.c or self.lv[0].inf > self.lv[1].sup + self.c: return FALSE
-        elif self.lv[0].inf == self.lv[0].sup and self.lv[1].inf == self.lv[1].sup and self.lv[0].inf == self.lv[1].inf + self.c: return TRUE
+        if SUP[self.lv[0].id] < INF[self.lv[1].id] + self.c or INF[self.lv[0].id] > SUP[self.lv[1].id] + self.c: return FALSE
+        elif INF[self.lv[0].id] == SUP[self.lv[0].id] and INF[self.lv[1].id] == SUP[self.lv[1].id] and INF[self.lv[0].id] == INF[self.lv[1].id] + self.c: return TRUE
         else: return UNKNOWN
 
     def tell(self):
@@ -419,7 +657,7 @@ class Equxyc(ArithmConstraint):
         self.decMax(2)
 
     def computeProximity(self):
-        return abs(self.lv[0].inf - self.lv[1].inf)
+        return abs(INF[self.lv[0].id] - INF[self.lv[1].id])
 
 #----------------------- U + V == W + c ---------------------------------------#
 class Equxyzc(ArithmConstraint):
@@ -431,59 +669,437 @@ class Equxyzc(ArithmConstraint):
     def incMin(self, i):
         assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
         if i == 1:
-            self.lv[2].isGE(self.lv[0].inf + self.lv[1].inf - self.c)
-            self.lv[1].isLE(self.lv[2].sup + self.c - self.lv[0].inf)
+            self.lv[2].isGE(INF[self.lv[0].id] + INF[self.lv[1].id] - self.c)
+            self.lv[1].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[0].id])
         elif i == 2:
-            self.lv[2].isGE(self.lv[1].inf + self.lv[0].inf - self.c)
-            self.lv[0].isLE(self.lv[2].sup + self.c - self.lv[1].inf)
+            self.lv[2].isGE(INF[self.lv[1].id] + INF[self.lv[0].id] - self.c)
+            self.lv[0].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[1].id])
         else:
-            self.lv[0].isGE(self.lv[2].inf + self.c - self.lv[1].sup)
-            self.lv[1].isGE(self.lv[2].inf + self.c - self.lv[0].sup)
+            self.lv[0].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[1].id])
+            self.lv[1].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[0].id])
     
     def decMax(self, i):
         assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
         if i == 1:
-            self.lv[2].isLE(self.lv[0].sup + self.lv[1].sup - self.c)
-            self.lv[1].isGE(self.lv[2].inf + self.c - self.lv[0].sup)
+            self.lv[2].isLE(SUP[self.lv[0].id] + SUP[self.lv[1].id] - self.c)
+            self.lv[1].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[0].id])
         elif i == 2:
-            self.lv[2].isLE(self.lv[1].sup + self.lv[0].sup - self.c)
-            self.lv[0].isGE(self.lv[2].inf + self.c - self.lv[1].sup)
+            self.lv[2].isLE(SUP[self.lv[1].id] + SUP[self.lv[0].id] - self.c)
+            self.lv[0].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[1].id])
         else:
-            self.lv[0].isLE(self.lv[2].sup + self.c - self.lv[1].inf)
-            self.lv[1].isLE(self.lv[2].sup + self.c - self.lv[0].inf)
+            self.lv[0].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[1].id])
+            self.lv[1].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[0].id])
  
     def setVal(self, i):
         assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
         if i == 1:
-            self.lv[1].isGE(self.lv[2].inf + self.c - self.lv[0].inf)
-            self.lv[1].isLE(self.lv[2].sup + self.c - self.lv[0].inf)
-            self.lv[2].isGE(self.lv[0].inf + self.lv[1].inf - self.c) 
-            self.lv[2].isLE(self.lv[0].inf + self.lv[1].sup - self.c)
+            self.lv[1].isGE(INF[self.lv[2].id] + self.c - INF[self.lv[0].id])
+            self.lv[1].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[0].id])
+            self.lv[2].isGE(INF[self.lv[0].id] + INF[self.lv[1].id] - self.c) 
+            self.lv[2].isLE(INF[self.lv[0].id] + SUP[self.lv[1].id] - self.c)
         elif i == 2:
-            self.lv[0].isGE(self.lv[2].inf + self.c - self.lv[1].inf)
-            self.lv[0].isLE(self.lv[2].sup + self.c - self.lv[1].inf)
-            self.lv[2].isGE(self.lv[1].inf + self.lv[0].inf - self.c) 
-            self.lv[2].isLE(self.lv[1].inf + self.lv[0].sup - self.c)
+            self.lv[0].isGE(INF[self.lv[2].id] + self.c - INF[self.lv[1].id])
+            self.lv[0].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[1].id])
+            self.lv[2].isGE(INF[self.lv[1].id] + INF[self.lv[0].id] - self.c) 
+            self.lv[2].isLE(INF[self.lv[1].id] + SUP[self.lv[0].id] - self.c)
         else:
-            self.lv[0].isGE(self.lv[2].inf + self.c - self.lv[1].sup)
-            self.lv[0].isLE(self.lv[2].inf + self.c - self.lv[1].inf)
-            self.lv[1].isGE(self.lv[2].inf + self.c - self.lv[0].sup) 
-            self.lv[1].isLE(self.lv[2].inf + self.c - self.lv[0].inf)
+            self.lv[0].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[1].id])
+            self.lv[0].isLE(INF[self.lv[2].id] + self.c - INF[self.lv[1].id])
+            self.lv[1].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[0].id]) 
+            self.lv[1].isLE(INF[self.lv[2].id] + self.c - INF[self.lv[0].id])
 
     def ask(self):
         assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
-        if self.lv[2].sup + self.c < self.lv[0].inf + self.lv[1].inf or self.lv[2].inf + self.c > self.lv[0].sup + self.lv[1].sup: return FALSE
-        elif self.lv[0].inf == self.lv[0].sup and self.lv[1].inf == self.lv[1].sup and self.lv[2].inf == self.lv[2].sup and self.lv[2].inf + self.c == self.lv[0].inf + self.lv[1].inf: return TRUE
+        if SUP[self.lv[2].id] + self.c < INF[self.lv[0].id] + INF[self.lv[1].id] or INF[self.lv[2].id] + self.c > SUP[self.lv[0].id] + SUP[self.lv[1].id]: return FALSE
+        elif INF[self.lv[0].id] == SUP[self.lv[0].id] and INF[self.lv[1].id] == SUP[self.lv[1].id] and INF[self.lv[2].id] == SUP[self.lv[2].id] and INF[self.lv[2].id] + self.c == INF[self.lv[0].id] + INF[self.lv[1].id]: return TRUE
         else: return UNKNOWN
 
     def tell(self):
         assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
-        self.lv[0].isGE(self.lv[2].inf + self.c - self.lv[1].sup)
-        self.lv[0].isLE(self.lv[2].sup + self.c - self.lv[1].inf)
-        self.lv[1].isGE(self.lv[2].inf + self.c - self.lv[0].sup)
-        self.lv[1].isLE(self.lv[2].sup + self.c - self.lv[0].inf)
-        self.lv[2].isGE(self.lv[1].inf + self.lv[0].inf - self.c) 
-        self.lv[2].isLE(self.lv[1].sup + self.lv[0].sup - self.c)
+        self.lv[0].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[1].id])
+        self.lv[0].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[1].id])
+        self.lv[1].isGE(INF[self.lv[2].id] + self.c - SUP[self.lv[0].id])
+        self.lv[1].isLE(SUP[self.lv[2].id] + self.c - INF[self.lv[0].id])
+        self.lv[2].isGE(INF[self.lv[1].id] + INF[self.lv[0].id] - self.c) 
+        self.lv[2].isLE(SUP[self.lv[1].id] + SUP[self.lv[0].id] - self.c)
+
+#----------------------- AllDifferent(Vi + oi) ---------------------------------------#
+# Bounds consistency in O(n log n) (Lopez-Ortiz, Quimper, Tromp, van Beek 2003).
+# The intervals [min, max] are ranked on the sorted distinct bounds (min and max+1),
+# then swept by increasing max to raise the minimums above the Hall intervals
+# (union-find like paths with compression), and symmetrically by decreasing min.
+
+def pathSet(t, start, end, to):
+    k = start
+    while k != end:
+        t[k], k = to, t[k]
+
+def pathMin(t, i):
+    while t[i] < i: i = t[i]
+    return i
+
+def pathMax(t, i):
+    while t[i] > i: i = t[i]
+    return i
+
+def hallLower(mins, maxs, minRank, maxRank, bounds, byMax): # New minimums
+    nb = len(bounds) - 2
+    t, h = list(range(-1, nb+1)), list(range(-1, nb+1))
+    d = [0] + [bounds[i] - bounds[i-1] for i in range(1, nb+2)]
+    news = mins[:]
+    for k in byMax:
+        x, y = minRank[k], maxRank[k]
+        z = pathMax(t, x+1)
+        j = t[z]
+        d[z] -= 1
+        if d[z] == 0:
+            t[z] = z+1
+            z = pathMax(t, t[z])
+            t[z] = j
+        pathSet(t, x+1, z, z)
+        if d[z] < bounds[z] - bounds[y]: raise FAIL("*** FAIL on allDifferent: more values than room ***")
+        if h[x] > x:
+            w = pathMax(h, h[x])
+            news[k] = bounds[w]
+            pathSet(h, x, w, w)
+        if d[z] == bounds[z] - bounds[y]: # Hall interval [bounds[j], bounds[y])
+            pathSet(h, h[y], j-1, y)
+            h[y] = j-1
+    return news
+
+def hallUpper(mins, maxs, minRank, maxRank, bounds, byMin): # New maximums
+    nb = len(bounds) - 2
+    t, h = list(range(1, nb+3)), list(range(1, nb+3))
+    d = [bounds[i+1] - bounds[i] for i in range(nb+1)] + [0]
+    news = maxs[:]
+    for k in reversed(byMin):
+        x, y = maxRank[k], minRank[k]
+        z = pathMin(t, x-1)
+        j = t[z]
+        d[z] -= 1
+        if d[z] == 0:
+            t[z] = z-1
+            z = pathMin(t, t[z])
+            t[z] = j
+        pathSet(t, x-1, z, z)
+        if d[z] < bounds[y] - bounds[z]: raise FAIL("*** FAIL on allDifferent: more values than room ***")
+        if h[x] < x:
+            w = pathMin(h, h[x])
+            news[k] = bounds[w] - 1
+            pathSet(h, x, w, w)
+        if d[z] == bounds[y] - bounds[z]: # Hall interval [bounds[y], bounds[j])
+            pathSet(h, h[y], j+1, y)
+            h[y] = j+1
+    return news
+
+class AllDifferent(Constraint):
+    priority = 1 # Woken after the binary constraints
+    def __init__(self, vars, offsets=None):
+        self.lv = list(vars)
+        self.offsets = list(offsets) if offsets else [ZERO] * len(self.lv)
+        self.running = False # Filtering in progress (eager propagation reenters)
+        self.dirty = False
+
+    def __str__(self): return "allDifferent({})".format(", ".join("{}{:+}".format(v.name, o) if o else v.name for v, o in zip(self.lv, self.offsets)))
+
+    def link(self):
+        for i, v in enumerate(self.lv): v.watch([self, i+1, 0])
+
+    def incMin(self, i):
+        assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def decMax(self, i):
+        assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def setVal(self, i):
+        assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def ask(self):
+        assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
+        ids = [(v.id, o) for v, o in zip(self.lv, self.offsets)]
+        ranges = sorted((INF[i]+o, SUP[i]+o) for i, o in ids)
+        if all(ranges[k][1] < ranges[k+1][0] for k in range(len(ranges)-1)): return TRUE
+        fixed = sorted(INF[i]+o for i, o in ids if INF[i] == SUP[i])
+        if any(fixed[k] == fixed[k+1] for k in range(len(fixed)-1)): return FALSE
+        return UNKNOWN
+
+    def tell(self):
+        assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
+        self.propagate()
+
+    def propagate(self): # Runs the Hall interval filtering to a fixpoint
+        if self.running:
+            self.dirty = True
+            return
+        n = len(self.lv)
+        if n < 2: return
+        self.running = True
+        try:
+            ids = [v.id for v in self.lv]
+            offsets = self.offsets
+            self.dirty = True
+            while self.dirty:
+                self.dirty = False
+                mins = [INF[i] + o for i, o in zip(ids, offsets)]
+                maxs = [SUP[i] + o for i, o in zip(ids, offsets)]
+                byMin = sorted(range(n), key=mins.__getitem__)
+                byMax = sorted(range(n), key=maxs.__getitem__)
+                bounds = [mins[byMin[0]] - 2] # Distinct bounds min and max+1, with sentinels
+                minRank, maxRank = [0] * n, [0] * n
+                i = j = 0
+                while j < n:
+                    if i < n and mins[byMin[i]] <= maxs[byMax[j]] + 1:
+                        k, b, rank = byMin[i], mins[byMin[i]], minRank
+                        i += 1
+                    else:
+                        k, b, rank = byMax[j], maxs[byMax[j]] + 1, maxRank
+                        j += 1
+                    if b != bounds[-1]: bounds.append(b)
+                    rank[k] = len(bounds) - 1
+                bounds.append(bounds[-1] + 2)
+                news = hallLower(mins, maxs, minRank, maxRank, bounds, byMax)
+                newc = hallUpper(mins, maxs, minRank, maxRank, bounds, byMin)
+                for v, o, a, b, s, c in zip(self.lv, offsets, mins, maxs, news, newc):
+                    if s > a: v.isGE(s - o)
+                    if c < b: v.isLE(c - o)
+        finally: self.running = False
+
+#----------------------- Temporal network ---------------------------------------#
+# A single propagator over the difference constraints U >= V + c posted while a network
+# is current (temporalNetwork()): one edge V -> U of weight c per constraint.
+# The lower bounds are pushed along the edges from the changed nodes (FIFO Bellman-Ford),
+# the upper bounds along the reversed edges, in one loop instead of a wakeup per
+# constraint and per step.
+# Within a propagation each node remembers the node its bound comes from: an update
+# closing a cycle of such parents proves a positive cycle (Cesta and Oddi), which fails
+# at once instead of creeping up to the HORIZON.
+# The edges added during the search (decided sides of the disjunctions) are stored.
+
+class TemporalNetwork(Constraint):
+    current = None # Network receiving the difference constraints
+    def __init__(self):
+        self.lv = [] # variable of each node
+        self.nodes = {} # node of each variable id
+        self.succ = [] # (node, c) edges out of each node (stored)
+        self.pred = [] # (node, c) edges into each node (stored)
+        self.lows, self.ups = deque(), deque() # nodes whose lower (upper) bound is to push
+        self.inLows, self.inUps = [], []
+        self.lowFrom, self.upFrom = [], [] # parent of each node in the propagation (-1: none)
+        self.touched = [] # nodes with a parent
+        self.lowTarget = self.upTarget = -1 # node being updated
+        self.running = False
+
+    def __str__(self): return "temporalNetwork({} nodes, {} edges)".format(len(self.lv), sum(map(len, self.succ)))
+
+    def node(self, v): # Node of v, created on the first edge
+        k = self.nodes.get(v.id)
+        if k is None:
+            k = self.nodes[v.id] = len(self.lv)
+            self.lv.append(v)
+            self.succ.append([])
+            self.pred.append([])
+            self.inLows.append(False)
+            self.inUps.append(False)
+            self.lowFrom.append(-1)
+            self.upFrom.append(-1)
+            v.watch([self, k+1, 0])
+        return k
+
+    def post(self, c): # Adds the edges of c, False when c is not a difference constraint
+        kind = type(c)
+        queued = bool(self.lows or self.ups)
+        if kind is Supxyc: self.edge(self.node(c.lv[1]), self.node(c.lv[0]), c.c)
+        elif kind is Infxyc: self.edge(self.node(c.lv[0]), self.node(c.lv[1]), -c.c)
+        elif kind is Equxyc:
+            u, v = self.node(c.lv[0]), self.node(c.lv[1])
+            self.edge(v, u, c.c)
+            self.edge(u, v, -c.c)
+        else: return False
+        if not Batch.current: self.propagate()
+        elif not queued: Batch.current.posted.append(self) # Once per batch
+        return True
+
+    def edge(self, a, b, c): # b >= a + c
+        assert(Logprint.logPrint(4, "==>Edge {} >= {} + {}".format(self.lv[b].name, self.lv[a].name, c))==None)
+        self.succ[a].append((b, c))
+        self.pred[b].append((a, c))
+        store.record(TemporalNetwork.unlink, self, a, b)
+        self.pushLow(a)
+        self.pushUp(b)
+
+    def unlink(self, a, b):
+        self.succ[a].pop()
+        self.pred[b].pop()
+
+    def detach(self): # The edges of the batch are undone on the trail, the network stays
+        self.clean()
+
+    def pushLow(self, k):
+        if not self.inLows[k]:
+            self.inLows[k] = True
+            self.lows.append(k)
+
+    def pushUp(self, k):
+        if not self.inUps[k]:
+            self.inUps[k] = True
+            self.ups.append(k)
+
+    def incMin(self, i):
+        assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
+        k = i - 1
+        if k == self.lowTarget: return # Pushed by the network, queued by propagate()
+        self.lowFrom[k] = -1 # Pushed by another constraint
+        if self.running: self.pushLow(k)
+        elif self.tightensLow(k):
+            self.pushLow(k)
+            self.propagate()
+
+    def decMax(self, i):
+        assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
+        k = i - 1
+        if k == self.upTarget: return
+        self.upFrom[k] = -1
+        if self.running: self.pushUp(k)
+        elif self.tightensUp(k):
+            self.pushUp(k)
+            self.propagate()
+
+    def setVal(self, i):
+        assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
+        k = i - 1
+        low, up = k != self.lowTarget, k != self.upTarget
+        if low: self.lowFrom[k] = -1
+        if up: self.upFrom[k] = -1
+        if self.running:
+            if low: self.pushLow(k)
+            if up: self.pushUp(k)
+            return
+        low = low and self.tightensLow(k)
+        up = up and self.tightensUp(k)
+        if low: self.pushLow(k)
+        if up: self.pushUp(k)
+        if low or up: self.propagate()
+
+    def tightensLow(self, a): # Some successor of a is to be pushed, the wakeups that change nothing stop here
+        lv = self.lv
+        x = INF[lv[a].id]
+        for b, c in self.succ[a]:
+            if x + c > INF[lv[b].id]: return True
+        return False
+
+    def tightensUp(self, b):
+        lv = self.lv
+        y = SUP[lv[b].id]
+        for a, c in self.pred[b]:
+            if y - c < SUP[lv[a].id]: return True
+        return False
+
+    def ask(self):
+        assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
+        ids = [v.id for v in self.lv]
+        b = TRUE
+        for a, edges in enumerate(self.succ):
+            for k, c in edges:
+                if SUP[ids[k]] < INF[ids[a]] + c: return FALSE
+                if INF[ids[k]] < SUP[ids[a]] + c: b = UNKNOWN
+        return b
+
+    def tell(self): # A first sweep in topological order when the network is acyclic
+        assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
+        order = self.topological()
+        if order:
+            self.running = True # The wakeups of the network only queue its nodes
+            try: self.sweep(order)
+            except BaseException:
+                self.clean()
+                raise
+            self.running = False
+        for k in range(len(self.lv)):
+            self.pushLow(k)
+            self.pushUp(k)
+        self.propagate()
+
+    def topological(self): # The nodes in topological order, None on a cycle
+        succ = self.succ
+        degree = [len(p) for p in self.pred]
+        order = [k for k, d in enumerate(degree) if not d]
+        for a in order:
+            for b, c in succ[a]:
+                degree[b] -= 1
+                if not degree[b]: order.append(b)
+        return order if len(order) == len(degree) else None
+
+    def sweep(self, order): # Lower bounds along the edges, then upper bounds against them
+        lv, succ, pred = self.lv, self.succ, self.pred
+        for a in order:
+            x = INF[lv[a].id]
+            for b, c in succ[a]:
+                if x + c > INF[lv[b].id]: lv[b].isGE(x + c)
+        for b in reversed(order):
+            y = SUP[lv[b].id]
+            for a, c in pred[b]:
+                if y - c < SUP[lv[a].id]: lv[a].isLE(y - c)
+
+    def propagate(self): # Pushes the bounds along the edges to a fixpoint
+        if self.running: return
+        self.running = True
+        lv, succ, pred = self.lv, self.succ, self.pred
+        lows, ups, inLows, inUps = self.lows, self.ups, self.inLows, self.inUps
+        lowFrom, upFrom, touched = self.lowFrom, self.upFrom, self.touched
+        try:
+            while lows or ups:
+                while lows:
+                    a = lows.popleft()
+                    inLows[a] = False
+                    x = INF[lv[a].id]
+                    for b, c in succ[a]:
+                        v = lv[b]
+                        if x + c > INF[v.id]:
+                            p = a
+                            while p >= 0:
+                                if p == b: raise FAIL("*** FAIL on positive cycle through {} ***".format(v.name))
+                                p = lowFrom[p]
+                            lowFrom[b] = a
+                            touched.append(b)
+                            self.lowTarget = b
+                            v.isGE(x + c)
+                            self.lowTarget = -1
+                            if INF[v.id] != x + c: lowFrom[b] = -1
+                            self.pushLow(b)
+                while ups:
+                    b = ups.popleft()
+                    inUps[b] = False
+                    y = SUP[lv[b].id]
+                    for a, c in pred[b]:
+                        v = lv[a]
+                        if y - c < SUP[v.id]:
+                            p = b
+                            while p >= 0:
+                                if p == a: raise FAIL("*** FAIL on positive cycle through {} ***".format(v.name))
+                                p = upFrom[p]
+                            upFrom[a] = b
+                            touched.append(a)
+                            self.upTarget = a
+                            v.isLE(y - c)
+                            self.upTarget = -1
+                            if SUP[v.id] != y - c: upFrom[a] = -1
+                            self.pushUp(a)
+        finally: self.clean()
+
+    def clean(self): # Empties the queues and the parents
+        lows, ups, inLows, inUps = self.lows, self.ups, self.inLows, self.inUps
+        lowFrom, upFrom, touched = self.lowFrom, self.upFrom, self.touched
+        for k in lows: inLows[k] = False
+        for k in ups: inUps[k] = False
+        lows.clear()
+        ups.clear()
+        for k in touched: lowFrom[k] = upFrom[k] = -1
+        del touched[:]
+        self.lowTarget = self.upTarget = -1
+        self.running = False
 
 class Logprint:
     logPrint = lambda *a, **k: None
@@ -492,5 +1108,194 @@ class Logprint:
         if verbose > 0: Logprint.logPrint = lambda *a, **k: print(a[1], **k) if a[0] <= verbose else None
         else: Logprint.logPrint = lambda *a, **k: None
 
+#---------------------------- Propagation ----------------------------------#
+#  EAGER: a bound change wakes up the attached constraints at once (recursion)
+#  QUEUE: wakeups are put on an agenda of [constraint, index, events] entries.
+#         An entry already pending only gets its events merged (deduplication)
+#         and the outermost bound change runs the agenda to a fixpoint.
 
+class Agenda:
+    def __init__(self, levels=2):
+        self.queues = [deque() for _ in range(levels)] # one FIFO per priority
+        self.running = False
 
+    def schedule(self, watchers, event):
+        for w in watchers:
+            if w[2]: w[2] |= event
+            else:
+                w[2] = event
+                self.queues[w[0].priority].append(w)
+        if not self.running: self.run()
+
+    def run(self): # Fixpoint loop, cheapest priority level first
+        assert(Logprint.logPrint(4, "==>RUN agenda")==None)
+        self.running = True
+        queues = self.queues
+        try:
+            while True:
+                for q in queues:
+                    if q: break
+                else: break
+                w = q.popleft()
+                e = w[2]
+                w[2] = 0
+                if e & SETVAL: w[0].setVal(w[1])
+                else:
+                    if e & INCMIN: w[0].incMin(w[1])
+                    if e & DECMAX: w[0].decMax(w[1])
+        except BaseException:
+            self.reset()
+            raise
+        finally: self.running = False
+
+    def reset(self): # Drop pending wakeups (on failure)
+        for q in self.queues:
+            for w in q: w[2] = 0
+            q.clear()
+
+class Propagation:
+    agenda = None
+
+    def __init__(self, mode=EAGER):
+        Propagation.agenda = Agenda() if mode == QUEUE else None
+
+class Batch:
+    current = None # Batch receiving the constraints
+    def __init__(self):
+        self.posted = [] # Constraints to propagate at close
+        self.top = store.top() # Generic trail at the opening
+        if not Batch.current: Batch.current = self
+
+    def __enter__(self): return self
+
+    def __exit__(self, kind, value, tb):
+        if kind is None: self.close()
+        elif Batch.current is self: self.discard()
+
+    def discard(self): # Left on an error: the constraints posted are unlinked, nothing is propagated
+        Batch.current = None
+        store.restore(self.top)
+        for c in reversed(self.posted): c.detach()
+        self.posted = []
+
+    def close(self): # One fixpoint over the constraints posted, on an agenda
+        if Batch.current is not self: return # Nested or closed
+        Batch.current = None
+        agenda = Propagation.agenda
+        a = Propagation.agenda = agenda or Agenda()
+        a.running = True # The wakeups are only queued
+        try:
+            for c in self.posted: c.tell()
+            a.running = False
+            a.run()
+        except BaseException:
+            a.reset()
+            raise
+        finally:
+            a.running = False
+            Propagation.agenda = agenda
+            self.posted = []
+
+#---------------------------- Profiling ----------------------------------#
+# profiling() wraps the propagation methods of all the constraint classes so that each
+# call is counted per class and per instance, with its own time and the number of calls
+# that changed a domain or failed. The domain changes are counted on the assignments of
+# the bounds and of the holes, whether or not the trails record them (stamping). The time
+# and changes of the nested calls (eager propagation) are given to the callee only.
+# profiling(False) puts the methods back: nothing is left on the calls when disabled.
+
+PROFILED = ('incMin', 'decMax', 'setVal', 'tell', 'ask')
+
+def profiling(on=True): # Profiles the propagation from now on, with new counts
+    if Profile.current: Profile.current.remove()
+    Profile.current = Profile() if on else None
+
+def subclasses(cls):
+    for c in cls.__subclasses__():
+        yield c
+        yield from subclasses(c)
+
+class Profile:
+    current = None # Profile in use
+    def __init__(self):
+        self.stats = {} # [constraint, {method: [calls, changed, failed, time]}] of each constraint id
+        self.stack = [] # [time, changes] of the nested calls of each call in progress
+        self.wrapped = [] # (class, method name, method)
+        self.changes = [0] # Domain changes so far
+        for cls in set(subclasses(Constraint)):
+            for name in PROFILED:
+                method = cls.__dict__.get(name)
+                if method:
+                    self.wrapped.append((cls, name, method))
+                    setattr(cls, name, self.probe(name, method))
+        for t in (INFS, SUPS): t.assign = self.counter(t)
+        method = BitVar.__dict__['isNEQ']
+        self.wrapped.append((BitVar, 'isNEQ', method))
+        BitVar.isNEQ = self.holes(method)
+
+    def remove(self):
+        for cls, name, method in self.wrapped: setattr(cls, name, method)
+        self.wrapped = []
+        for t in (INFS, SUPS): t.__dict__.pop('assign', None)
+
+    def counter(self, track): # Track.assign counting the bound changes, for the current trailing mode
+        changes = self.changes
+        def assign(i, value):
+            changes[0] += 1
+            Track.assign(track, i, value)
+        return assign
+
+    def holes(self, isNEQ): # BitVar.isNEQ counting the holes made
+        changes = self.changes
+        def call(v, x):
+            bits = v.bits
+            isNEQ(v, x)
+            if v.bits != bits: changes[0] += 1
+        return call
+
+    def probe(self, name, method):
+        stats, stack, changes = self.stats, self.stack, self.changes
+        def call(c, *args):
+            stack.append([0.0, 0])
+            failed = 0
+            t, n = perf_counter(), changes[0]
+            try: return method(c, *args)
+            except FAIL:
+                failed = 1
+                raise
+            finally:
+                t, n = perf_counter() - t, changes[0] - n
+                nested = stack.pop()
+                if stack:
+                    stack[-1][0] += t
+                    stack[-1][1] += n
+                entry = stats.get(id(c))
+                if entry is None: entry = stats[id(c)] = [c, {}]
+                s = entry[1].get(name)
+                if s is None: s = entry[1][name] = [0, 0, 0, 0.0]
+                s[0] += 1
+                if n > nested[1]: s[1] += 1
+                s[2] += failed
+                s[3] += t - nested[0]
+        return call
+
+    def classes(self): # (class name, method, calls, changed, failed, time) sorted by time
+        total = {}
+        for c, methods in self.stats.values():
+            for name, s in methods.items():
+                t = total.setdefault((type(c).__name__, name), [0, 0, 0, 0.0])
+                for k in range(4): t[k] += s[k]
+        return sorted((k + tuple(t) for k, t in total.items()), key=lambda r: -r[5])
+
+    def instances(self, top=10): # (constraint, calls, changed, failed, time) of the top constraints by time
+        rows = [(c,) + tuple(map(sum, zip(*methods.values()))) for c, methods in self.stats.values()]
+        return sorted(rows, key=lambda r: -r[4])[:top]
+
+    def report(self, top=10):
+        lines = ["{:<16} {:<7} {:>10} {:>10} {:>7} {:>8} {:>10}".format("class", "method", "calls", "changed", "yield", "failed", "time")]
+        for cls, name, calls, changed, failed, t in self.classes():
+            lines.append("{:<16} {:<7} {:>10} {:>10} {:>6.1f}% {:>8} {:>9.4f}s".format(cls, name, calls, changed, 100 * changed / calls, failed, t))
+        lines.append("{:<35} {:>10} {:>10} {:>7} {:>8} {:>10}".format("top constraints", "calls", "changed", "yield", "failed", "time"))
+        for c, calls, changed, failed, t in self.instances(top):
+            lines.append("{:<35.35} {:>10} {:>10} {:>6.1f}% {:>8} {:>9.4f}s".format(str(c), calls, changed, 100 * changed / calls, failed, t))
+        return "\n".join(lines)
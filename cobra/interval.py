@@ -5,16 +5,24 @@
 # This software is released as Open Source under the terms of a 3-clause BSD license #
 #------------------------------------------------------------------------------------#
 
+from bisect import bisect_left, bisect_right
 import store
 from . import filter
-from .filter import Logprint
+from .filter import Logprint, INF, SUP
 
 #------------------------------- API ------------------------------------------------#
-__all__ = ('clear', 'Interval', 'startBeforeEnd', 'startBeforeStart', 'endBeforeEnd', 'endBeforeStart', 'startAtEnd', 'startAtStart', 'endAtEnd', 'endAtStart')
+__all__ = ('clear', 'getState', 'setState', 'Interval', 'noOverlap', 'NoOverlap', 'cumulative', 'Cumulative', 'startBeforeEnd', 'startBeforeStart', 'endBeforeEnd', 'endBeforeStart', 'startAtEnd', 'startAtStart', 'endAtEnd', 'endAtStart', 'precedences')
 
 #------------------------------ Closing ---------------------------------------------#
 def clear():
     Interval.instances=[]
+    NoOverlap.instances=[]
+    Cumulative.instances=[]
+
+def getState(): return Interval.instances, NoOverlap.instances, Cumulative.instances
+
+def setState(state=None):
+    Interval.instances, NoOverlap.instances, Cumulative.instances = state or ([], [], [])
 
 #---------------- Precedence constraints over intervals -----------------------------#
 
@@ -42,10 +50,15 @@ def endAtEnd(a, b, z=filter.ZERO): # e(a) + z <= e(b) # a, b Interval
 def endAtStart(a, b, z=filter.ZERO): # e(a) + z <= s(b) # a, b Interval
     return(filter.equxyc(b.st, a.st, a.sp+z))
 
+def precedences(intervals, triples): # e(pred) + lag <= s(succ) for each (pred, succ, lag), indexes in intervals
+    with filter.batch():
+        for a, b, z in filter.rows(triples): endBeforeStart(intervals[a], intervals[b], z)
+
 #----------------------------------- Intervals --------------------------------------#
 
 class Interval(): # Task with a variable earliest starting time and a fixed duration
     instances = []
+    postponed = None # Earliest starting time when postponed by SetTimes search (stored)
     def __init__(self, name, est=filter.START, sp=filter.ZERO, lct=filter.HORIZON, clas=None):
         self.key = 'Int'+name
         self.st = filter.Var('ST'+name, est, lct-sp) # est (stored)
@@ -63,3 +76,386 @@ class Interval(): # Task with a variable earliest starting time and a fixed dura
     def duration(self): return self.sp
 
     def __str__(self): return self.key+":("+str(self.st)+"):"+str(self.sp)+":"+str(self.clas)
+
+#------------------------------ Unary resource --------------------------------------#
+# noOverlap: the intervals are processed one at a time (O(n log n) filtering, Vilim).
+#  - overload checking and edge finding (Theta-Lambda tree)
+#  - detectable precedences (Theta tree)
+#  - not-first/not-last (Theta tree)
+# The algorithms are written for the earliest starting times. The latest completion
+# times are filtered by the same algorithms on the mirrored intervals (t -> -t).
+
+NOTIME = -(1 << 62) # Earliest completion time of an empty set
+
+def noOverlap(intervals): # Pairwise disjoint intervals
+    c = NoOverlap(intervals); c.link(); filter.post(c); return c
+
+class ThetaTree: # Theta-Lambda tree, leaves sorted by earliest starting time
+    def __init__(self, est, p):
+        n = len(est)
+        self.est, self.p = est, p
+        self.size = size = 1 << max(n-1, 0).bit_length()
+        self.leaf = [0] * n
+        for k, i in enumerate(sorted(range(n), key=est.__getitem__)): self.leaf[i] = size + k
+        m = 2 * size
+        self.sum = [0] * m # processing time of Theta
+        self.ect = [NOTIME] * m # earliest completion time of Theta
+        self.sumB = [0] * m # same with at most one gray (Lambda) interval
+        self.ectB = [NOTIME] * m
+        self.respS = [-1] * m # gray interval responsible for sumB
+        self.respE = [-1] * m # gray interval responsible for ectB
+
+    def fill(self): # All intervals in Theta
+        for i, k in enumerate(self.leaf): self.white(i, k)
+        for k in range(self.size-1, 0, -1): self.combine(k)
+
+    def white(self, i, k):
+        p = self.p[i]
+        self.sum[k] = self.sumB[k] = p
+        self.ect[k] = self.ectB[k] = self.est[i] + p
+        self.respS[k] = self.respE[k] = -1
+
+    def insert(self, i): # Into Theta
+        k = self.leaf[i]
+        self.white(i, k)
+        self.update(k)
+
+    def gray(self, i): # From Theta to Lambda
+        k = self.leaf[i]
+        p = self.p[i]
+        self.sum[k] = 0
+        self.ect[k] = NOTIME
+        self.sumB[k] = p
+        self.ectB[k] = self.est[i] + p
+        self.respS[k] = self.respE[k] = i
+        self.update(k)
+
+    def remove(self, i):
+        k = self.leaf[i]
+        self.sum[k] = self.sumB[k] = 0
+        self.ect[k] = self.ectB[k] = NOTIME
+        self.respS[k] = self.respE[k] = -1
+        self.update(k)
+
+    def update(self, k):
+        k >>= 1
+        while k:
+            self.combine(k)
+            k >>= 1
+
+    def combine(self, k):
+        l = 2 * k
+        r = l + 1
+        S, E, SB, EB = self.sum, self.ect, self.sumB, self.ectB
+        sl, sr = S[l], S[r]
+        S[k] = sl + sr
+        E[k] = max(E[r], E[l] + sr)
+        a, b = SB[l] + sr, sl + SB[r]
+        if a >= b: SB[k], self.respS[k] = a, self.respS[l]
+        else: SB[k], self.respS[k] = b, self.respS[r]
+        a, b, c = EB[r], E[l] + SB[r], EB[l] + sr
+        if a >= b and a >= c: EB[k], self.respE[k] = a, self.respE[r]
+        elif b >= c: EB[k], self.respE[k] = b, self.respS[r]
+        else: EB[k], self.respE[k] = c, self.respE[l]
+
+    def ectWithout(self, i, inside): # ECT(Theta \ {i})
+        if not inside: return self.ect[1]
+        self.remove(i)
+        e = self.ect[1]
+        self.insert(i)
+        return e
+
+def edgeFinding(est, lct, p): # Returns the new earliest starting times
+    n = len(est)
+    new = est[:]
+    tree = ThetaTree(est, p)
+    tree.fill()
+    q = sorted(range(n), key=lct.__getitem__, reverse=True)
+    for k in range(n):
+        j = q[k]
+        if tree.ect[1] > lct[j]: raise filter.FAIL("*** FAIL on overload ***")
+        tree.gray(j)
+        if k + 1 == n: break
+        l = lct[q[k+1]]
+        while tree.ectB[1] > l:
+            i = tree.respE[1]
+            if i < 0: raise filter.FAIL("*** FAIL on overload ***")
+            if tree.ect[1] > new[i]: new[i] = tree.ect[1]
+            tree.remove(i)
+    return new
+
+def detectablePrecedences(est, lct, p): # Returns the new earliest starting times
+    n = len(est)
+    new = est[:]
+    ect = [est[i] + p[i] for i in range(n)]
+    lst = [lct[i] - p[i] for i in range(n)]
+    tree = ThetaTree(est, p)
+    inside = [False] * n
+    q = sorted(range(n), key=lst.__getitem__)
+    k = 0
+    for i in sorted(range(n), key=ect.__getitem__):
+        while k < n and ect[i] > lst[q[k]]:
+            tree.insert(q[k]); inside[q[k]] = True
+            k += 1
+        e = tree.ectWithout(i, inside[i])
+        if e > new[i]: new[i] = e
+    return new
+
+def notLast(est, lct, p): # Returns the new latest completion times
+    n = len(est)
+    new = lct[:]
+    lst = [lct[i] - p[i] for i in range(n)]
+    tree = ThetaTree(est, p)
+    inside = [False] * n
+    q = sorted(range(n), key=lst.__getitem__)
+    k = 0
+    j = -1
+    for i in sorted(range(n), key=lct.__getitem__):
+        while k < n and lct[i] > lst[q[k]]:
+            j = q[k]
+            tree.insert(j); inside[j] = True
+            k += 1
+        if tree.ectWithout(i, inside[i]) > lst[i] and lst[j] < new[i]: new[i] = lst[j]
+    return new
+
+class NoOverlap(filter.Constraint): # Unary resource over intervals
+    priority = 1 # Woken after the binary constraints
+    instances = []
+    bounds = None # Starting time bounds at the last fixpoint (stored), the wakeups without a change are skipped
+    def __init__(self, intervals):
+        self.intervals = list(intervals)
+        self.running = False # Filtering in progress (eager propagation reenters)
+        self.instances.append(self)
+
+    def __str__(self): return "noOverlap({})".format(", ".join(a.key for a in self.intervals))
+
+    def link(self):
+        for i, a in enumerate(self.intervals): a.st.watch([self, i+1, 0])
+
+    def incMin(self, i):
+        assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def decMax(self, i):
+        assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def setVal(self, i):
+        assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def ask(self):
+        assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
+        ids = [(a.st.id, a.sp) for a in self.intervals]
+        parts = sorted((INF[i], INF[i]+p, SUP[i]+p) for i, p in ids)
+        if all(parts[k][2] <= parts[k+1][0] for k in range(len(parts)-1)): return filter.TRUE
+        fixed = sorted((SUP[i], INF[i]+p) for i, p in ids if SUP[i] < INF[i]+p) # Compulsory parts
+        if any(fixed[k][1] > fixed[k+1][0] for k in range(len(fixed)-1)): return filter.FALSE
+        return filter.UNKNOWN
+
+    def tell(self):
+        assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
+        self.propagate()
+
+    def propagate(self): # Runs the filtering algorithms to a fixpoint
+        if self.running: return # The changes made meanwhile are seen by the loop below
+        self.running = True
+        try:
+            sts = [a.st for a in self.intervals]
+            ids = [v.id for v in sts]
+            bounds = [INF[i] for i in ids] + [SUP[i] for i in ids]
+            if bounds == self.bounds: return
+            n = len(ids)
+            p = [a.sp for a in self.intervals]
+            while True:
+                est = bounds[:n]
+                lct = [t + d for t, d in zip(bounds[n:], p)]
+                mest, mlct = [-t for t in lct], [-t for t in est] # Mirrored intervals
+                news = map(max, edgeFinding(est, lct, p), detectablePrecedences(est, lct, p), [-t for t in notLast(mest, mlct, p)])
+                newc = map(min, [-t for t in edgeFinding(mest, mlct, p)], [-t for t in detectablePrecedences(mest, mlct, p)], notLast(est, lct, p))
+                for v, d, s, c in zip(sts, p, news, newc):
+                    v.isGE(s)
+                    v.isLE(c - d)
+                new = [INF[i] for i in ids] + [SUP[i] for i in ids]
+                if new == bounds: break
+                bounds = new
+            store.assign(self, 'bounds', bounds)
+        finally: self.running = False
+
+#---------------------------- Cumulative resource -----------------------------------#
+# cumulative: at any time the demands of the running intervals do not exceed the capacity.
+#  - timetabling on the profile of the compulsory parts [lst, ect)
+#  - timetable edge finding (optional, O(n^2), Vilim / Schutt and Wolf)
+# The profile is a step function (times, heights): heights[k] holds over [times[k], times[k+1]).
+# It is maintained incrementally: a compulsory part only grows within a world, the new
+# slices are added to a copy of the profile which replaces the stored one.
+# As for noOverlap the latest completion times are filtered on the mirrored intervals.
+
+def cumulative(intervals, demands, capacity, edgeFinding=False): # Cumulative resource
+    c = Cumulative(intervals, demands, capacity, edgeFinding); c.link(); filter.post(c); return c
+
+def addSlice(profile, a, b, h, capacity): # Returns a new profile with h added over [a, b)
+    times, heights = profile[0][:], profile[1][:]
+    for t in (a, b):
+        k = bisect_right(times, t) - 1
+        if times[k] != t:
+            times.insert(k+1, t)
+            heights.insert(k+1, heights[k])
+    for k in range(bisect_left(times, a), bisect_left(times, b)):
+        heights[k] += h
+        if heights[k] > capacity: raise filter.FAIL("*** FAIL on resource overload at {} ***".format(times[k]))
+    return times, heights
+
+def mirror(times, heights): # Profile over -t
+    return [NOTIME] + [-t for t in reversed(times[1:])], heights[-1:] + heights[-2::-1]
+
+def timetable(est, lct, p, d, capacity, times, heights): # Returns the new earliest starting times
+    new = est[:]
+    m = len(times)
+    for i in range(len(est)):
+        if not p[i] or not d[i]: continue
+        lst, ect = lct[i] - p[i], est[i] + p[i]
+        if est[i] == lst: continue
+        t = est[i]
+        k = bisect_right(times, t) - 1
+        while k < m and times[k] < t + p[i]:
+            h = heights[k] - d[i] if lst <= times[k] < ect else heights[k] # Without its own compulsory part
+            if h + d[i] > capacity:
+                if k + 1 == m or times[k+1] > lst: raise filter.FAIL("*** FAIL on resource overload ***")
+                t = times[k+1]
+            k += 1
+        new[i] = t
+    return new
+
+def timetableEdgeFinding(est, lct, p, d, capacity, times, heights): # Returns the new earliest starting times
+    n = len(est)
+    new = est[:]
+    cum = [0, 0] # energy of the profile up to each time point
+    for k in range(2, len(times)): cum.append(cum[-1] + heights[k-1] * (times[k] - times[k-1]))
+    def energy(t): # energy of the profile before t
+        k = bisect_right(times, t) - 1
+        return cum[k] + heights[k] * (t - times[k]) if k else 0
+    cp = [max(lct[i] - p[i], est[i]) for i in range(n)], [min(est[i] + p[i], lct[i]) for i in range(n)]
+    free = [d[i] * (p[i] - max(cp[1][i] - cp[0][i], 0)) for i in range(n)] # energy out of the compulsory part
+    order = sorted(range(n), key=est.__getitem__)
+    rank = [0] * n
+    for k, i in enumerate(order): rank[i] = k
+    for b in sorted(set(lct)):
+        eb = energy(b)
+        avail = [0] * n # available energy of the window [est, b)
+        e = 0
+        for k in range(n-1, -1, -1):
+            j = order[k]
+            a = est[j]
+            if lct[j] <= b: e += free[j]
+            if a >= b: avail[k] = None; continue
+            avail[k] = capacity * (b - a) - eb + energy(a) - e
+            if avail[k] < 0: raise filter.FAIL("*** FAIL on resource overload ***")
+        best = None
+        for k in range(n): # smallest available energy of the windows [a, b) with a <= est[order[k]]
+            if avail[k] is not None and (best is None or avail[k] < best): best = avail[k]
+            avail[k] = best
+        for i in range(n):
+            if lct[i] <= b or est[i] >= b or not d[i]: continue
+            av = avail[rank[i]]
+            inside = max(min(cp[1][i], b) - cp[0][i], 0) # compulsory part of i already in the profile
+            if d[i] * (min(b, est[i] + p[i]) - est[i] - inside) > av:
+                t = b - inside - av // d[i]
+                if t > new[i]: new[i] = t
+    return new
+
+class Cumulative(filter.Constraint): # Cumulative resource over intervals
+    priority = 1 # Woken after the binary constraints
+    instances = []
+    def __init__(self, intervals, demands, capacity, edgeFinding=False):
+        self.intervals = list(intervals)
+        self.demands = list(demands)
+        self.capacity = capacity
+        self.edgeFinding = edgeFinding
+        n = len(self.intervals)
+        self.start = [0] * n # compulsory parts in the profile (stored)
+        self.end = [0] * n # (stored)
+        self.profile = [NOTIME], [0] # (stored)
+        self.running = False # Filtering in progress (eager propagation reenters)
+        self.dirty = False
+        self.instances.append(self)
+
+    def __str__(self): return "cumulative({}, {})".format(", ".join("{}*{}".format(a.key, d) for a, d in zip(self.intervals, self.demands)), self.capacity)
+
+    def link(self):
+        for i, a in enumerate(self.intervals): a.st.watch([self, i+1, 0])
+
+    def incMin(self, i):
+        assert(Logprint.logPrint(4, "==>incMin on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def decMax(self, i):
+        assert(Logprint.logPrint(4, "==>decMax on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def setVal(self, i):
+        assert(Logprint.logPrint(4, "==>setVal on {!s} {!s}".format(self, i))==None)
+        self.propagate()
+
+    def ask(self):
+        assert(Logprint.logPrint(4, "==>ASK on {!s}".format(self))==None)
+        profile = [NOTIME], [0]
+        fixed = True
+        try:
+            for a, d in zip(self.intervals, self.demands):
+                i = a.st.id
+                if SUP[i] < INF[i] + a.sp: profile = addSlice(profile, SUP[i], INF[i] + a.sp, d, self.capacity)
+                fixed = fixed and (INF[i] == SUP[i] or not d or not a.sp)
+        except filter.FAIL: return filter.FALSE
+        return filter.TRUE if fixed else filter.UNKNOWN
+
+    def tell(self):
+        assert(Logprint.logPrint(4, "==> TELL on {!s}".format(self))==None)
+        self.propagate()
+
+    def update(self): # Adds the growth of the compulsory parts to the profile
+        profile = self.profile
+        for k, a in enumerate(self.intervals):
+            d = self.demands[k]
+            if not d: continue
+            i = a.st.id
+            s, e = SUP[i], INF[i] + a.sp
+            if s >= e: continue
+            s0, e0 = self.start[k], self.end[k]
+            if s0 == s and e0 == e: continue
+            if s0 >= e0: profile = addSlice(profile, s, e, d, self.capacity)
+            else:
+                if s < s0: profile = addSlice(profile, s, s0, d, self.capacity)
+                if e > e0: profile = addSlice(profile, e0, e, d, self.capacity)
+            store.assignAt(self.start, k, s)
+            store.assignAt(self.end, k, e)
+        if profile is not self.profile: store.assign(self, 'profile', profile)
+
+    def propagate(self): # Runs the filtering algorithms to a fixpoint
+        if self.running:
+            self.dirty = True
+            return
+        self.running = True
+        try:
+            p = [a.sp for a in self.intervals]
+            d, capacity = self.demands, self.capacity
+            sts = [a.st for a in self.intervals]
+            ids = [v.id for v in sts]
+            self.dirty = True
+            while self.dirty:
+                self.dirty = False
+                self.update()
+                times, heights = self.profile
+                mtimes, mheights = mirror(times, heights)
+                est = [INF[i] for i in ids]
+                lct = [SUP[i] + x for i, x in zip(ids, p)]
+                mest, mlct = [-t for t in lct], [-t for t in est] # Mirrored intervals
+                news = timetable(est, lct, p, d, capacity, times, heights)
+                newc = [-t for t in timetable(mest, mlct, p, d, capacity, mtimes, mheights)]
+                if self.edgeFinding:
+                    news = map(max, news, timetableEdgeFinding(est, lct, p, d, capacity, times, heights))
+                    newc = map(min, newc, [-t for t in timetableEdgeFinding(mest, mlct, p, d, capacity, mtimes, mheights)])
+                for v, x, s, c in zip(sts, p, news, newc):
+                    v.isGE(s)
+                    v.isLE(c - x)
+        finally: self.running = False
@@ -0,0 +1,52 @@
+#------------------------------------------------------------------------------------#
+# model.py: Model Context                                                            #
+# Copyright © 2015 - 2019 Thales SA - All Rights Reserved                            #
+# Author: Pierre Savéant                                                             #
+# This software is released as Open Source under the terms of a 3-clause BSD license #
+#------------------------------------------------------------------------------------#
+
+import store
+from . import filter
+from . import interval
+from . import bool
+
+#------------------------------- API ------------------------------------------------#
+__all__ = ('Model',)
+
+#------------------------------- Model ----------------------------------------------#
+# A model owns its variables, constraints, domains and trails. The propagators work
+# on the state in use, so a model is put in use by a with statement:
+#     m = Model()
+#     with m: ... # builds m, or solves it
+# The state of the model in use is put aside at entry and back at exit. An Optimizer
+# runs within the model it was created in, whichever is in use when it is called.
+# Models are switched, not shared: many models can live in one process and be built
+# or solved in turn, but only one at a time (one process per thread of work).
+# The default model is in use at load time.
+
+class Model:
+    current = None # Model in use
+    def __init__(self):
+        self.state = None # State put aside when not in use, None for a new model
+        self.previous = [] # Model in use before each entry
+
+    def __enter__(self):
+        self.previous.append(Model.current)
+        if Model.current is not self: switch(Model.current, self)
+        return self
+
+    def __exit__(self, *exc):
+        previous = self.previous.pop()
+        if previous is not self: switch(self, previous)
+
+def switch(old, new): # Puts aside the state of old, new in use
+    old.state = store.getState(), filter.getState(), interval.getState(), bool.getState()
+    state = new.state or (None, None, None, None)
+    store.setState(state[0])
+    filter.setState(state[1])
+    interval.setState(state[2])
+    bool.setState(state[3])
+    new.state = None
+    Model.current = new
+
+Model.current = Model()
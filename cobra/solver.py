@@ -6,21 +6,30 @@
 #------------------------------------------------------------------------------------#
 
 from time import perf_counter, process_time
+try: from resource import getrusage, RUSAGE_SELF
+except ImportError: getrusage = None # Not on Windows
+from sys import platform
 from collections import namedtuple
+import multiprocessing
+import queue
+import json
+from itertools import chain, takewhile
+from operator import attrgetter
 import store
 from . import filter
 from . import interval
 from . import bool
-from .filter import Logprint
+from .filter import Logprint, INF, SUP
+from .model import Model
 
 #------------------------------------------------------------------------------------#
 # Tree search is viewed as a recursive process, where the search space is            #
 # iteratively decomposed by opening choice points and posting constraints            #
-# on each branch.                                                                    #
+# on each branch. The recursion is unfolded on an explicit stack of choice points.   #
 #------------------------------------------------------------------------------------#
 
 #-------------------------- API -----------------------------------------------------
-__all__ = ('Optimizer', 'Solution', 'showVar', 'validate')
+__all__ = ('Optimizer', 'Solution', 'showVar', 'validate', 'Interrupted', 'PORTFOLIO', 'ndjsonSink', 'binarySink', 'Hooks', 'Progress')
 
 def showVar(d):
     for v in d.items(): Logprint.logPrint(2,"{}={}".format(v[0], v[1]))
@@ -41,6 +50,25 @@ def validate(vars, sol): # vars is a list, sol is a dicho
 
 Solution = namedtuple('Solution', ['vars', 'objname', 'objvalue', 'backtracks', 'proof', 'duration', 'completion', 'nsol'])
 
+def ndjsonSink(f, vars=None): # Writes each solution on a line of f as a JSON object {name: value}
+    names = [(v.name, v.id) for v in (vars or filter.Var.instances)]
+    return lambda values: f.write(json.dumps({name: values[i] for name, i in names}) + "\n")
+
+def binarySink(f): # Writes the values of each solution to the binary file f as array('l') items, in variable id order
+    return lambda values: values.tofile(f)
+
+Hooks = namedtuple('Hooks', ['node', 'failure', 'solution', 'bound', 'restart', 'progress'])
+Progress = namedtuple('Progress', ['time', 'nodes', 'rate', 'depth', 'trail', 'backtracks', 'solutions', 'best', 'bound', 'gap'])
+
+class Interrupted(Exception): pass # Search stopped from outside (portfolio) or by a limit
+
+INFINITY = float('inf')
+CHECK = 16 # Nodes between two readings of the clocks and of the memory
+RSSMB = 1024 * 1024 if platform == 'darwin' else 1024 # ru_maxrss per MB: in bytes on macOS, in KB elsewhere
+
+# Default portfolio: (disjStatic, disjChoice, disjSide) combinations
+PORTFOLIO = [dict(disjStatic=x, disjChoice=y, disjSide=z) for x, y, z in ((2, 1, 0), (1, 4, 0), (0, 0, 0), (2, 1, 4), (1, 4, 3), (4, 2, 0), (3, 1, 6), (2, 3, 0))]
+
 #------------------------------- Optimizer ------------------------------------
 #  VERBOSE=0: Quiet
 #  VERBOSE=2: Branching in action
@@ -89,12 +117,22 @@ class Optimizer:
     NONOVERLAP3 = []
     CUMULATIVE = []
     currentSolution = {}
+    currentValues = None
+    candidates = [] # Disjunctions possibly open (stored)
+    first = 0 # Candidates before are closed (stored)
+    unfixed = [] # Variables possibly unfixed, in VARIABLES order (stored)
+    firstVar = 0 # Unfixed variables before are fixed (stored)
+    holes = False # Some variables are BitVar, their domain size is not given by the bounds
     InitialBound=None
     Bound=None
     NBsol=0
     NBopt=0 # Number of optimal solutions
     NBbk=0 # Number of attempts
     NBbkTot=0
+    NBnodes=0 # Number of branches posted
+    limits = None # (nodes, backtracks, wall deadline, cpu deadline, trail, memory) of the run
+    checkAt = INFINITY # Number of nodes of the next check of the limits
+    bkAt = INFINITY # Number of backtracks (NBbk) of the backtrack limit
     ROOT=True
     MINI=True
     ALLSOL=False
@@ -103,17 +141,42 @@ class Optimizer:
     DISJSIDE=0
     SEARCH=0
     VARCHOICE=0
+    PROPAGATION=filter.EAGER
+    SETTINGS = {} # Constructor arguments, for the portfolio workers
+    shared = None # Portfolio: (best objective value, stop event) shared by the workers
+    leader = None # Portfolio: optimizer of the parent process
+    levels = [] # Counting: number of solutions counted at each depth
+    work = None # Parallel search: (task queue, #queued, #idle, #pending) shared by the workers
+    lost = None # Parallel search: error of a subtree the worker could not explore
+    prefix = [] # Parallel search: decisions leading to the current subtree
+    stack = [] # Choice points of the current explore
+    completion = None # Last run of solutions() completed
+    model = None # Model of the optimizer, in use during its runs
+    profile = None # Propagation report of the last optimize() when profiling is on
+    hooks = None # Telemetry: Hooks of observe(), None when nothing is observed
+    period = 1.0 # Telemetry: seconds between two progress snapshots
+    progressAt = INFINITY # Telemetry: time of the next progress snapshot
+    started = 0.0 # Telemetry: time of the start of the run
+    rootBound = None # Telemetry: bound of the objective at the root (lower when minimizing)
 
 # search=0 : Disjunctive Search
 # search=1 : SetTimes Search (Asap)
 # search=2 : Enumerate on variables
 # search=3 : Dichotomic search
 
-    def __init__(self, objective=None, search=0, mini=True, bound=None, incBound=None, root=True, disjStatic=2, disjChoice=1, disjSide=0, varChoice=0):
+# propagation=0 : Eager propagation (recursive wakeups)
+# propagation=1 : Queue-based propagation (agenda run to a fixpoint)
+
+    def __init__(self, objective=None, search=0, mini=True, bound=None, incBound=None, root=True, disjStatic=2, disjChoice=1, disjSide=0, varChoice=0, propagation=filter.EAGER):
         self.OBJECTIVE=objective
         self.SEARCH=search
+        self.model = Model.current
+        self.currentSolution = {}
         self.VARIABLES=filter.Var.instances
-        if interval != None:self.ACTIVITIES=interval.Interval.instances
+        if interval != None:
+            self.ACTIVITIES=interval.Interval.instances
+            self.NONOVERLAP=interval.NoOverlap.instances
+            self.CUMULATIVE=interval.Cumulative.instances
         if bool != None: self.DISJUNCTIONS=bool.Disjunction.instances
         Logprint.logPrint(2, "#disjunctions = {}".format(len(self.DISJUNCTIONS)))
         self.MINI=mini
@@ -122,6 +185,8 @@ class Optimizer:
         self.DISJCHOICE=disjChoice
         self.DISJSIDE=disjSide
         self.VARCHOICE=varChoice
+        self.PROPAGATION=propagation
+        self.SETTINGS = dict(search=search, mini=mini, bound=bound, incBound=incBound, root=root, disjStatic=disjStatic, disjChoice=disjChoice, disjSide=disjSide, varChoice=varChoice, propagation=propagation)
 
         if not objective: # Decision problem
             self.enforceBound = lambda: None
@@ -154,16 +219,17 @@ class Optimizer:
                 self.ALLSOL = True
                 self.enforceBB = lambda: self.enforceBound()
 
+        # Candidates: disjunctions possibly open, sorted by the static key of the heuristic
         if disjChoice==0: # implementation order
-            self.nextDisjunction = lambda: next((d for d in self.DISJUNCTIONS if d.active == filter.TRUE and (d.left == filter.UNKNOWN or d.right == filter.UNKNOWN)), False)
+            self.nextDisjunction = lambda: next(self.openFirst(), False)
         elif disjChoice==1: # heaviest weight first
-            self.nextDisjunction = lambda: max((d for d in self.DISJUNCTIONS if d.active == filter.TRUE and (d.left == filter.UNKNOWN or d.right == filter.UNKNOWN)), key=lambda x: x.weight, default=False)
+            self.nextDisjunction = lambda: next(self.openFirst(), False)
         elif disjChoice==2: # largest proximity first
-            self.nextDisjunction = lambda: max((d for d in self.DISJUNCTIONS if d.active == filter.TRUE and (d.left == filter.UNKNOWN or d.right == filter.UNKNOWN)), key=lambda x: x.proximity, default=False)
+            self.nextDisjunction = lambda: next(self.openFirst(), False)
         elif disjChoice==3: # heaviest weight first and then earliest time
-            self.nextDisjunction = lambda: min((d for d in maxs([d for d in self.DISJUNCTIONS if d.active == filter.TRUE and (d.left == filter.UNKNOWN or d.right == filter.UNKNOWN)], key=lambda x: x.weight, default=False)), key=lambda d: min(d.const[0].lv[1].inf, d.const[1].lv[1].inf), default=False)
+            self.nextDisjunction = lambda: self.heaviestEarliest()
         elif disjChoice==4: # latest time first = Maximum of Minimum Earliest Starting Time
-            self.nextDisjunction = lambda: max((d for d in self.DISJUNCTIONS if d.active == filter.TRUE and (d.left == filter.UNKNOWN or d.right == filter.UNKNOWN)), key=lambda d: min(d.const[0].lv[1].inf, d.const[1].lv[1].inf), default=False)
+            self.nextDisjunction = lambda: max(self.openDisjunctions(), key=lambda d: min(INF[d.const[0].lv[1].id], INF[d.const[1].lv[1].id]), default=False)
         elif disjChoice==5: # Smallest Proximity of Maximum of Minimum Earliest Starting Time
             self.nextDisjunction = lambda: minProxMaxMinEST(self.DISJUNCTIONS)
 
@@ -174,41 +240,175 @@ class Optimizer:
         elif disjSide==2: # lowest weight first
             self.leftFirst = lambda d: d.const[1].computeWeight() >= d.const[0].computeWeight()
         elif disjSide==3: # latest starting first
-            self.leftFirst = lambda d: d.const[0].lv[1].inf >= d.const[1].lv[1].inf
+            self.leftFirst = lambda d: INF[d.const[0].lv[1].id] >= INF[d.const[1].lv[1].id]
         elif disjSide==4: # earliest starting first
-            self.leftFirst = lambda d: d.const[0].lv[1].inf <= d.const[1].lv[1].inf
+            self.leftFirst = lambda d: INF[d.const[0].lv[1].id] <= INF[d.const[1].lv[1].id]
         elif disjSide==5: # latest ending first
-            self.leftFirst = lambda d: d.const[0].lv[1].inf + d.const[0].computeWeight() >= d.const[1].lv[1].inf + d.const[1].computeWeight()
+            self.leftFirst = lambda d: INF[d.const[0].lv[1].id] + d.const[0].computeWeight() >= INF[d.const[1].lv[1].id] + d.const[1].computeWeight()
         elif disjSide==6: # earliest ending first
-            self.leftFirst = lambda d: d.const[0].lv[1].inf + d.const[0].computeWeight() <= d.const[1].lv[1].inf + d.const[1].computeWeight()
+            self.leftFirst = lambda d: INF[d.const[0].lv[1].id] + d.const[0].computeWeight() <= INF[d.const[1].lv[1].id] + d.const[1].computeWeight()
 
         if varChoice==0: # implementation order
-            self.nextVar = lambda: next((v for v in self.VARIABLES if v.inf != v.sup), False)
+            self.nextVar = lambda: self.firstUnfixed()
         elif varChoice==1: # minimum domain first
-            self.nextVar = lambda: min((v for v in self.VARIABLES if v.inf != v.sup), key=lambda x: x.sup - x.inf, default=False)
+            self.nextVar = lambda: self.smallestDomain()
+
+    def saveSolution(self): # Buffer copy, the dictionary is built at the end of the run
+        self.currentValues = INF[:]
 
-    def saveSolution(self):
-        for v in self.VARIABLES:
-            self.currentSolution[v.name] = v.inf
+    def loadSolution(self):
+        if self.currentValues:
+            for v in self.VARIABLES:
+                self.currentSolution[v.name] = self.currentValues[v.id]
 
     def nbSol(self): return self.NBsol
 
+    def openFirst(self): # Open candidates from the first one, the closed ones ahead are skipped below this node
+        candidates = self.candidates
+        first = self.first
+        for k in range(first, len(candidates)):
+            d = candidates[k]
+            if d.active == filter.TRUE and (d.left == filter.UNKNOWN or d.right == filter.UNKNOWN):
+                if first is not None:
+                    if k != first: store.assign(self, 'first', k)
+                    first = None
+                yield d
+
+    def openDisjunctions(self): # The candidates list is compacted when half of it is closed
+        candidates = self.candidates
+        opened = [d for d in candidates if d.active == filter.TRUE and (d.left == filter.UNKNOWN or d.right == filter.UNKNOWN)]
+        if len(opened) <= len(candidates) // 2: store.assign(self, 'candidates', opened)
+        return opened
+
+    def heaviestEarliest(self):
+        opened = self.openFirst()
+        d = next(opened, False)
+        if not d: return False
+        w = d.weight
+        return min(chain((d,), takewhile(lambda x: x.weight == w, opened)), key=lambda d: min(INF[d.const[0].lv[1].id], INF[d.const[1].lv[1].id]))
+
+    def firstUnfixed(self): # The fixed variables ahead are skipped below this node
+        unfixed = self.unfixed
+        for k in range(self.firstVar, len(unfixed)):
+            v = unfixed[k]
+            if INF[v.id] != SUP[v.id]:
+                if k != self.firstVar: store.assign(self, 'firstVar', k)
+                return v
+        return False
+
+    def unfixedVars(self): # The unfixed list is compacted when half of it is fixed
+        unfixed = self.unfixed
+        vars = [v for v in unfixed if INF[v.id] != SUP[v.id]]
+        if len(vars) <= len(unfixed) // 2: store.assign(self, 'unfixed', vars)
+        return vars
+
+    def smallestDomain(self): # First unfixed variable of minimum domain
+        vars = self.unfixedVars()
+        if not vars: return False
+        if self.holes: sizes = [v.size() for v in vars]
+        else: sizes = [SUP[v.id] - INF[v.id] for v in vars]
+        return vars[sizes.index(min(sizes))]
+
     def disjunctions(self): return "Current Disjunctions={}".format(self.DISJUNCTIONS)
     def showDisj(self):
         for d in self.DISJUNCTIONS: print("{!s}({!s},{!s})".format(d, d.left, d.right))
 
     def variables(self): return "Current Variables={}".format(self.VARIABLES)
 
-    def optimize(self, timeout=None):
+    def optimize(self, timeout=None, cpu=None, nodes=None, backtracks=None, trail=None, memory=None):
+        # Limits of the run: wall and cpu time in seconds, nodes, backtracks, size of the trails and peak memory in MB
+        if self.model is not Model.current:
+            with self.model: return self.optimize(timeout, cpu, nodes, backtracks, trail, memory)
         user_start = process_time()
-        self.NBsol = self.NBopt = self.NBbk = self.NBbkTot = 0
+        self.start(timeout, cpu, nodes, backtracks, trail, memory)
+        agenda = filter.Propagation.agenda
+        filter.Propagation(self.PROPAGATION)
+        try:
+            w = store.current() # In case of interruption
+            completion = self.solve()
+            store.backtrack(w) # In case of interruption
+        except (KeyboardInterrupt, Interrupted):
+            store.backtrack(w) # In case of interruption
+            completion = False
+        filter.Propagation.agenda = agenda
+        self.loadSolution()
+        self.NBbkTot += self.NBbk
+        user_end = process_time() # perf_counter()
+        if filter.Profile.current: self.profile = filter.Profile.current.report()
+        if self.OBJECTIVE: Logprint.logPrint(2, "======****===== Optimization {} ({}), {} in {} backtracks ({} for proof) and {}".format("completed" if completion else "interrupted", self.NBopt, "{}".format("{}({})={}".format("min" if self.MINI else "max", self.OBJECTIVE.name, self.currentSolution.get(self.OBJECTIVE.name)) if self.currentSolution else "no solution found") if self.OBJECTIVE else "" if self.currentSolution else "no solution found", self.NBbkTot, self.NBbk if completion else 0, durationPrettyPrint(user_start, user_end)))
+        return Solution(self.currentSolution,
+                        self.OBJECTIVE.name if self.OBJECTIVE else None,
+                        self.currentSolution.get(self.OBJECTIVE.name) if self.OBJECTIVE else None,
+                        self.NBbkTot,
+                        self.NBbk if completion else 0,
+                        durationPrettyPrint(user_start, user_end),
+                        completion,
+                        self.NBsol)
+
+    #---------------------------- Solution stream ---------------------------------
+    # solutions() runs the search as optimize() does but yields each solution as soon as
+    # it is found, as the array of the values indexed by the variable ids (a copy of INF):
+    # the value of v is values[v.id]. Nothing is kept by the optimizer but the last one.
+    # The search is suspended in the world of the solution between two steps and goes on
+    # when the caller asks for the next one. Closing the generator (or leaving a for loop
+    # over it) ends the search and restores the root world.
+    # A sink, e.g. ndjsonSink(f) or binarySink(f), receives each solution before the caller.
+
+    def solutions(self, sink=None, **limits): # Generator of the solutions, limits as in optimize()
+        if self.model is not Model.current:
+            with self.model: return (yield from self.solutions(sink, **limits))
+        self.start(**limits)
+        agenda = filter.Propagation.agenda
+        filter.Propagation(self.PROPAGATION)
+        w = store.current()
+        self.completion = False
+        try:
+            for values in self.solving():
+                if sink: sink(values)
+                yield values
+            self.completion = True
+        except (KeyboardInterrupt, Interrupted): pass
+        finally:
+            store.backtrack(w)
+            filter.Propagation.agenda = agenda
+            self.loadSolution()
+            self.NBbkTot += self.NBbk
+
+    #---------------------------- Counting ---------------------------------
+    # count() runs the search to count the solutions only: a leaf is not saved and does not
+    # tighten the bound (the objective is ignored). On variables (search 2 and 3) a node whose
+    # unfixed variables are only involved in entailed constraints is a leaf too, counted as the
+    # product of their domain sizes. levels[d] is the number of solutions counted at depth d.
+
+    def count(self, **limits): # Solution with the number of solutions, limits as in optimize()
+        allsol = self.ALLSOL
+        self.ALLSOL = True
+        self.newSolution = self.countSolution
+        self.nextValue = lambda: False if self.free() else Optimizer.nextValue(self)
+        self.nextSplit = lambda: False if self.free() else Optimizer.nextSplit(self)
+        self.levels = []
+        try: return self.optimize(**limits)
+        finally:
+            self.ALLSOL = allsol
+            del self.newSolution, self.nextValue, self.nextSplit
+
+    def start(self, timeout=None, cpu=None, nodes=None, backtracks=None, trail=None, memory=None): # Resets the run
+        self.NBsol = self.NBopt = self.NBbk = self.NBbkTot = self.NBnodes = 0
+        if timeout is None and cpu is None and nodes is None and backtracks is None and trail is None and memory is None: self.limits = None
+        else: self.limits = (nodes, backtracks, None if timeout is None else perf_counter() + timeout, None if cpu is None else process_time() + cpu, trail, memory)
+        self.started = perf_counter()
+        self.progressAt = self.started + self.period if self.hooks and self.hooks.progress else INFINITY
+        self.checkAt = 0 if self.limits or self.progressAt != INFINITY else INFINITY
+        self.rootBound = None
+        self.bkAt = INFINITY if backtracks is None else backtracks
         self.currentSolution.clear()
+        self.currentValues = None
         if self.OBJECTIVE:
             self.Bound = self.InitialBound
             if self.DISJSTATIC==0: # no reordering
                 pass
             elif self.DISJSTATIC==1: # reverse declaration order
-                self.DISJUNCTIONS.reverse()
+                self.DISJUNCTIONS=self.DISJUNCTIONS[::-1]
             elif self.DISJSTATIC==2: # earliest time order
                 self.DISJUNCTIONS=sorted(self.DISJUNCTIONS, key=lambda d: min(d.const[0].lv[1].inf, d.const[1].lv[1].inf), reverse=False)
             elif self.DISJSTATIC==3: # latest time order
@@ -217,6 +417,13 @@ class Optimizer:
                 self.DISJUNCTIONS=sorted(self.DISJUNCTIONS, key=lambda d: d.proximity)
             Logprint.logPrint(2, "-{} {} with initial bound at {} and increment at {}".format("Minimizing" if self.MINI else "Maximizing", self.OBJECTIVE.name, self.Bound, self.incBound))
             Logprint.logPrint(2, "-Restarting from root" if self.ROOT else "-Chronological backtracking")
+        if self.DISJCHOICE == 1 or self.DISJCHOICE == 3: self.candidates = sorted(self.DISJUNCTIONS, key=attrgetter('weight'), reverse=True) # stable
+        elif self.DISJCHOICE == 2: self.candidates = sorted(self.DISJUNCTIONS, key=attrgetter('proximity'), reverse=True)
+        else: self.candidates = self.DISJUNCTIONS[:]
+        self.first = 0
+        self.unfixed = self.VARIABLES[:]
+        self.firstVar = 0
+        self.holes = any(isinstance(v, filter.BitVar) for v in self.VARIABLES)
 
         if self.SEARCH == 0: # Disjunctive Search
             Logprint.logPrint(2, "-Disjunctive Search")
@@ -240,8 +447,8 @@ class Optimizer:
             elif self.DISJSIDE==4: Logprint.logPrint(2, "   -Earliest starting time disjunction side first")
             elif self.DISJSIDE==5: Logprint.logPrint(2, "   -Latest ending time disjunction side first")
             elif self.DISJSIDE==6: Logprint.logPrint(2, "   -Earliest ending time disjunction side first")
-        elif self.SEARCH == 1:
-            pass
+        elif self.SEARCH == 1: # SetTimes Search
+            Logprint.logPrint(2, "-SetTimes Search")
         elif self.SEARCH == 2 or self.SEARCH == 3:
             if self.SEARCH == 2: # -Enumeration on variables
                 Logprint.logPrint(2, "-Enumeration on variables")
@@ -251,128 +458,430 @@ class Optimizer:
             elif self.VARCHOICE==1: Logprint.logPrint(2, "   -minimum domain first variable order")
         else:
             pass
-        try:
-            w = store.current() # In case of interruption
-            completion = self.solve()
-            store.backtrack(w) # In case of interruption
-        except KeyboardInterrupt: 
-            store.backtrack(w) # In case of interruption
-            completion = False
-        self.NBbkTot += self.NBbk
-        user_end = process_time() # perf_counter()
-        if self.OBJECTIVE: Logprint.logPrint(2, "======****===== Optimization {} ({}), {} in {} backtracks ({} for proof) and {}".format("completed" if completion else "interrupted", self.NBopt, "{}".format("{}({})={}".format("min" if self.MINI else "max", self.OBJECTIVE.name, self.currentSolution.get(self.OBJECTIVE.name)) if self.currentSolution else "no solution found") if self.OBJECTIVE else "" if self.currentSolution else "no solution found", self.NBbkTot, self.NBbk if completion else 0, durationPrettyPrint(user_start, user_end)))
+        Logprint.logPrint(2, "-Queue-based propagation" if self.PROPAGATION == filter.QUEUE else "-Eager propagation")
+
+    #---------------------------- Portfolio ---------------------------------
+    # The configurations run in a pool of forked processes, each on its copy of the model.
+    # The workers share the best objective value: a worker reads it at each backtrack
+    # and posts the bound it implies. The first worker completing its search stops the others.
+
+    def portfolio(self, configs=PORTFOLIO, processes=None):
+        # configs: list of dictionaries of Optimizer arguments overriding the settings of self
+        if self.model is not Model.current:
+            with self.model: return self.portfolio(configs, processes)
+        ctx = multiprocessing.get_context('fork')
+        user_start = perf_counter() # Wall clock, the work is done in the workers
+        Optimizer.leader = self
+        best = ctx.Value('q', (self.InitialBound + self.incBound) if self.OBJECTIVE else 0)
+        stop = ctx.Event()
+        with ctx.Pool(processes, initializer=initWorker, initargs=(best, stop)) as pool:
+            results = [r for r in pool.imap_unordered(runWorker, configs) if r]
+        Optimizer.leader = None
+        for config, sol in results:
+            Logprint.logPrint(2, "-Worker {}: {}, {} in {} backtracks".format(config, "completed" if sol.completion else "interrupted", "{}={}".format(sol.objname, sol.objvalue) if sol.vars else "no solution found", sol.backtracks))
+        found = [sol for config, sol in results if sol.vars]
+        if self.OBJECTIVE and found: sol = (min if self.MINI else max)(found, key=lambda s: s.objvalue)
+        else: sol = next((s for s in found if s.completion), found[0] if found else None)
+        completion = any(s.completion for config, s in results)
+        self.currentSolution.clear()
+        if sol: self.currentSolution.update(sol.vars)
+        self.NBsol = sum(s.nsol for config, s in results)
         return Solution(self.currentSolution,
                         self.OBJECTIVE.name if self.OBJECTIVE else None,
-                        self.currentSolution.get(self.OBJECTIVE.name) if self.OBJECTIVE else None,
-                        self.NBbkTot,
-                        self.NBbk if completion else 0,
-                        durationPrettyPrint(user_start, user_end),
+                        sol.objvalue if sol else None,
+                        sum(s.backtracks for config, s in results),
+                        next((s.proof for config, s in results if s.completion), 0),
+                        durationPrettyPrint(user_start, perf_counter()),
                         completion,
                         self.NBsol)
 
+    def poll(self): # Portfolio worker: stop request and bound of the best solution of all the workers
+        best, stop = self.shared
+        if stop.is_set(): raise Interrupted
+        if self.OBJECTIVE:
+            b = best.value - self.incBound
+            if b < self.Bound if self.MINI else b > self.Bound: self.Bound = b
+            self.enforceBound()
+
+    def publish(self): # Portfolio worker: shares the objective value of a new solution
+        if not self.OBJECTIVE: return
+        best = self.shared[0]
+        value = self.OBJECTIVE.inf if self.MINI else self.OBJECTIVE.sup
+        with best.get_lock():
+            if value < best.value if self.MINI else value > best.value: best.value = value
+
+    #---------------------------- Parallel Search ---------------------------------
+    # The search tree is split into subtrees, each described by the decisions leading to it
+    # from the root, (choice point code, left branch) pairs, and explored by forked workers
+    # which replay the decisions on their copy of the model. Starting from the whole tree,
+    # a busy worker gives away the right branch of its shallowest open choice point as soon
+    # as a worker is idle, so the subtrees are large and the workers seldom wait.
+    # The subtrees are disjoint: solution counts and optimal values are those of the sequential run.
+    # A subtree whose exploration overflows (RecursionError, MemoryError) is queued again once on
+    # an optimization, to be replayed under a better bound; then parallel() raises the error.
+
+    def parallel(self, processes=None):
+        if self.model is not Model.current:
+            with self.model: return self.parallel(processes)
+        ctx = multiprocessing.get_context('fork')
+        user_start = perf_counter() # Wall clock, the work is done in the workers
+        processes = processes or multiprocessing.cpu_count()
+        Optimizer.leader = self
+        best = ctx.Value('q', (self.InitialBound + self.incBound) if self.OBJECTIVE else 0)
+        stop = ctx.Event()
+        tasks, results = ctx.Queue(), ctx.Queue()
+        work = tasks, ctx.Value('i', 1), ctx.Value('i', 0), ctx.Value('i', 1)
+        tasks.put(([], False)) # The whole tree, (prefix, queued again)
+        workers = [ctx.Process(target=runSubtrees, args=(best, stop, work, results)) for i in range(processes)]
+        for p in workers: p.start()
+        sols, lost = [], None
+        while len(sols) < processes:
+            try:
+                sol, error = results.get()
+                sols.append(sol)
+                lost = lost or error
+            except KeyboardInterrupt: stop.set() # The workers are interrupted too and return their solutions
+        for p in workers: p.join()
+        Optimizer.leader = None
+        if lost: raise type(lost)("Parallel search: a subtree could not be explored ({})".format(lost))
+        found = [s for s in sols if s and s.vars]
+        if self.OBJECTIVE and found: sol = (min if self.MINI else max)(found, key=lambda s: s.objvalue)
+        else: sol = found[0] if found else None
+        if None in sols: completion = False # Worker lost
+        elif self.ALLSOL or not found: completion = all(s.completion for s in sols)
+        else: completion = True # One solution wanted: found
+        sols = [s for s in sols if s]
+        self.currentSolution.clear()
+        if sol: self.currentSolution.update(sol.vars)
+        self.NBsol = sum(s.nsol for s in sols)
+        backtracks = sum(s.backtracks for s in sols)
+        Logprint.logPrint(2, "-Parallel search on {} workers {}, {} in {} backtracks".format(processes, "completed" if completion else "interrupted", "{}={}".format(sol.objname, sol.objvalue) if sol and self.OBJECTIVE else "{} solution(s)".format(self.NBsol), backtracks))
+        return Solution(self.currentSolution,
+                        self.OBJECTIVE.name if self.OBJECTIVE else None,
+                        sol.objvalue if sol else None,
+                        backtracks,
+                        backtracks if completion else 0,
+                        durationPrettyPrint(user_start, perf_counter()),
+                        completion,
+                        self.NBsol)
+
+    def subtrees(self): # Parallel worker: explores the subtrees of the task queue
+        tasks, queued, idle, pending = self.work
+        stop = self.shared[1]
+        self.decisions = (self.DISJUNCTIONS, self.ACTIVITIES, self.VARIABLES, self.VARIABLES)[self.SEARCH]
+        self.codes = {o: k for k, o in enumerate(self.decisions)}
+        decide = (self.trySide, self.tryTask, self.tryValue, self.trySplit)[self.SEARCH]
+        while not stop.is_set():
+            with idle.get_lock(): idle.value += 1
+            task = None
+            while task is None and pending.value and not stop.is_set():
+                try: task = tasks.get(timeout=0.01)
+                except queue.Empty: pass
+            with idle.get_lock(): idle.value -= 1
+            if task is None: break
+            with queued.get_lock(): queued.value -= 1
+            prefix, again = task
+            self.prefix = prefix
+            self.stack = []
+            world = store.current()
+            store.push()
+            try:
+                self.poll() # The replay runs under the best bound too
+                for (k, v), left in prefix:
+                    decide((self.decisions[k], v), left)
+                    self.poll()
+                if self.SEARCH == 0: self.search()
+                elif self.SEARCH == 1: self.setTimes()
+                elif self.SEARCH == 2: self.enumerate()
+                elif self.SEARCH == 3: self.dicho()
+                if not self.ALLSOL: stop.set() # One solution wanted: found
+            except filter.FAIL: pass
+            except (RecursionError, MemoryError) as e:
+                if self.OBJECTIVE and not again: # Whole subtree again: the parts given away are explored twice, the optimum is kept
+                    Logprint.logPrint(2, "-Subtree {} failed: {!r}, queued again".format(prefix, e))
+                    with pending.get_lock(): pending.value += 1
+                    with queued.get_lock(): queued.value += 1
+                    tasks.put((prefix, True))
+                else: # Lost, the run is stopped
+                    Logprint.logPrint(2, "-Subtree {} lost: {!r}".format(prefix, e))
+                    self.lost = e
+                    stop.set()
+            store.backtrack(world)
+            with pending.get_lock(): pending.value -= 1
+        return self.lost is None
+
+    def share(self): # Parallel worker: stop request, shared bound and a subtree for an idle worker
+        self.poll()
+        tasks, queued, idle, pending = self.work
+        if idle.value > queued.value:
+            stack = self.stack
+            for i, (cp, left) in enumerate(stack):
+                if left: # Shallowest open choice point
+                    path = [((self.codes[d], v), l is not False) for (d, v), l in stack[:i]]
+                    path.append(((self.codes[cp[0]], cp[1]), False))
+                    stack[i] = (cp, None)
+                    with pending.get_lock(): pending.value += 1
+                    with queued.get_lock(): queued.value += 1
+                    tasks.put((self.prefix + path, False))
+                    break
+
     def solve(self):
+        for values in self.solving(): pass
+        return True
+
+    def solving(self): # Yields the values of each solution
+        choose, decide, shallow = ((self.nextSide, self.trySide, False), (self.nextTask, self.tryTask, False), (self.nextValue, self.tryValue, True), (self.nextSplit, self.trySplit, False))[self.SEARCH]
+        if self.hooks and (self.hooks.node or self.hooks.failure): decide = self.observed(decide)
         store.push()
         try:
             while True:
                 assert(Logprint.logPrint(2, "======****====> Looking for a solution {}".format("at {}={}".format(self.OBJECTIVE.name, self.Bound) if self.OBJECTIVE else ""))==None)
                 self.enforceBound()
-                if self.SEARCH == 0: self.search()
-                elif self.SEARCH == 1: pass
-                elif self.SEARCH == 2: self.enumerate()
-                elif self.SEARCH == 3: self.dicho()
-                else: pass
+                if self.OBJECTIVE: # Root bound of the solutions better than the bound, hence of the optimum
+                    b = self.OBJECTIVE.inf if self.MINI else self.OBJECTIVE.sup
+                    if self.rootBound is None or (b > self.rootBound if self.MINI else b < self.rootBound): self.rootBound = b
+                yield from self.walk(choose, decide, shallow)
                 if not self.OBJECTIVE: raise filter.FAIL
+                if self.hooks: self.notify('restart', self.Bound)
         except filter.FAIL: pass
         store.back()
         if self.OBJECTIVE: Logprint.logPrint(2, "<=====****===== Optimum proved in {} backtracks".format(self.NBbk))
-        return True
 
-    def enumerate(self): # Branch and Bound on variables. Depth-first search. With exception.
-        x = self.nextVar()
-        if x:
-            v = x.inf
-            store.push()
-            try:
-                assert(Logprint.logPrint(2, "==> Try {} = {}".format(x.name, v))==None)
-                x.isEQ(v)
-                self.enumerate()
-            except filter.FAIL:
-                store.back()
-                self.NBbk +=1
-                x.isGE(v+filter.UN)
-                self.enforceBB()
-                self.enumerate()
-            else:
-                store.back()
-        else:
-            self.NBsol += 1
-            assert(Logprint.logPrint(2, "<=====****===== Found solution n°{} in {} backtracks{}".format(self.NBsol, self.NBbk, " at {}={}".format(self.OBJECTIVE.name, self.OBJECTIVE.inf if self.MINI else self.OBJECTIVE.sup) if self.OBJECTIVE else ""))==None)
-            self.saveSolution()
-            self.Bound = self.newBound()
-            self.NBbkTot += self.NBbk; self.NBbk = 0
-            if self.ALLSOL: raise filter.FAIL
-
-    def dicho(self): # Branch and Bound on variables. Dichotomic search. With exception.
-        x = self.nextVar()
-        if x:
-            mid = (x.inf+x.sup)//filter.DEUX
-            store.push()
+    def enumerate(self): # Branch and Bound on variables. Depth-first search.
+        self.explore(self.nextValue, self.tryValue, shallow=True)
+
+    def dicho(self): # Branch and Bound on variables. Dichotomic search.
+        self.explore(self.nextSplit, self.trySplit)
+
+    def search(self): # Branch and Bound on disjunctions.
+        self.explore(self.nextSide, self.trySide)
+
+    def setTimes(self): # Branch and Bound on start times. Schedule or postpone.
+        self.explore(self.nextTask, self.tryTask)
+
+    def explore(self, choose, decide, shallow=False): # Depth-first search with an explicit stack of choice points.
+        for values in self.walk(choose, decide, shallow): pass
+
+    def walk(self, choose, decide, shallow): # The search of explore(), yields the values of each solution
+        # choose() returns the next choice point or False at a leaf, decide(cp, left) posts one branch.
+        # A shallow right branch is posted in the world of its choice point (no push, no backtrack counted).
+        world = store.current()
+        stack = self.stack = [] # (choice point, True while in the left branch, None when its right branch is given away)
+        while True:
             try:
-                assert(Logprint.logPrint(2, "==> Try {} <= {}".format(x.name, mid))==None)
-                x.isLE(mid)
-                self.dicho()
-            except filter.FAIL:
-                store.back()
-                self.NBbk +=1
-                self.enforceBB()
+                cp = choose()
+                if not cp:
+                    self.newSolution()
+                    yield self.currentValues
+                    if not self.ALLSOL:
+                        store.backtrack(world)
+                        return
+                    raise filter.FAIL
                 store.push()
-                try: 
-                    assert(Logprint.logPrint(2, "==> Try {} > {}".format(x.name, mid))==None)
-                    x.isGE(mid+filter.UN)
-                    self.dicho()
-                except filter.FAIL:
+                stack.append((cp, True))
+                self.NBnodes += 1
+                if self.NBnodes >= self.checkAt: self.checkLimits()
+                decide(cp, True)
+                continue
+            except filter.FAIL: pass
+            while stack: # Backtrack to the deepest choice point still in its left branch
+                cp, left = stack.pop()
+                if left is not False or not shallow:
                     store.back()
                     self.NBbk +=1
-                    raise filter.FAIL
-                else: store.back()
-            else: store.back()
+                    if self.NBbk >= self.bkAt: self.checkLimits()
+                if left:
+                    try: self.enforceBB()
+                    except filter.FAIL: continue
+                    if not shallow: store.push()
+                    stack.append((cp, False))
+                    self.NBnodes += 1
+                    if self.NBnodes >= self.checkAt: self.checkLimits()
+                    try:
+                        decide(cp, False)
+                        break
+                    except filter.FAIL: pass
+            else: raise filter.FAIL
+
+    def checkLimits(self): # Interrupts the run when a limit is reached, the clocks are read every CHECK nodes
+        if self.progressAt != INFINITY and perf_counter() >= self.progressAt:
+            self.progressAt = perf_counter() + self.period
+            self.notify('progress', self.progress())
+        if not self.limits:
+            self.checkAt = self.NBnodes + CHECK
+            return
+        nodes, backtracks, wall, cpu, trail, memory = self.limits
+        if nodes is not None and self.NBnodes >= nodes: reason = "{} nodes".format(nodes)
+        elif backtracks is not None and self.NBbkTot + self.NBbk >= backtracks: reason = "{} backtracks".format(backtracks)
+        elif wall is not None and perf_counter() >= wall: reason = "time"
+        elif cpu is not None and process_time() >= cpu: reason = "cpu time"
+        elif trail is not None and store.size() >= trail: reason = "trail size {}".format(trail)
+        elif memory is not None and getrusage and getrusage(RUSAGE_SELF).ru_maxrss >= memory * RSSMB: reason = "memory {} MB".format(memory)
         else:
-            self.NBsol += 1
-            assert(Logprint.logPrint(2, "<=====****===== Found solution n°{} in {} backtracks{}".format(self.NBsol, self.NBbk, " at {}={}".format(self.OBJECTIVE.name, self.OBJECTIVE.inf if self.MINI else self.OBJECTIVE.sup) if self.OBJECTIVE else ""))==None)
-            self.saveSolution()
-            self.Bound = self.newBound()
-            self.NBbkTot += self.NBbk; self.NBbk = 0
-            if self.ALLSOL: raise filter.FAIL
-
-    def search(self): # Branch and Bound on disjunctions with exception.
-        d=self.nextDisjunction()
-        if d:
-            left=self.leftFirst(d)
-            store.push()
-            try: 
-                d.settled(left)
-                self.search()
+            self.checkAt = self.NBnodes + CHECK if nodes is None else min(self.NBnodes + CHECK, nodes)
+            return
+        Logprint.logPrint(2, "-Limit reached: {}".format(reason))
+        raise Interrupted(reason)
+
+    #---------------------------- Telemetry ---------------------------------
+    # observe() registers hooks called along the runs of optimize(), solutions() and count(),
+    # with the optimizer first: node(opt, depth) before a branch is posted, failure(opt, depth)
+    # when it fails, solution(opt, value) with the objective value (None without objective),
+    # bound(opt, bound) with the bound tightened by a solution, restart(opt, bound) when the
+    # search restarts from the root and progress(opt, snapshot) every period seconds (read
+    # every CHECK nodes) with a Progress snapshot. A hook returning a true value stops the run
+    # as a limit does. The node and failure hooks wrap the branching: nothing is paid when
+    # they are not given. The portfolio and parallel workers are not observed.
+
+    def observe(self, node=None, failure=None, solution=None, bound=None, restart=None, progress=None, period=1.0):
+        hooks = Hooks(node, failure, solution, bound, restart, progress)
+        self.hooks = hooks if any(hooks) else None
+        self.period = period
+        return self
+
+    def notify(self, name, *args): # Calls a hook, a true value returned stops the run
+        hook = getattr(self.hooks, name)
+        if hook and hook(self, *args):
+            Logprint.logPrint(2, "-Stopped by the {} hook".format(name))
+            raise Interrupted("{} hook".format(name))
+
+    def observed(self, decide): # decide() calling the node and failure hooks
+        def observe(cp, left):
+            self.notify('node', len(self.stack))
+            try: decide(cp, left)
             except filter.FAIL:
-                store.back()
-                self.NBbk +=1
-                self.enforceBB()
-                store.push()
-                try: 
-                    d.settled(not(left))
-                    self.search()
-                except filter.FAIL:
-                    store.back()
-                    self.NBbk +=1
-                    raise filter.FAIL
-                else: store.back()
-            else: store.back()
+                self.notify('failure', len(self.stack))
+                raise
+        return observe
+
+    def progress(self): # Progress snapshot of the run, the gap is relative to the best value
+        elapsed = perf_counter() - self.started
+        best = self.currentValues[self.OBJECTIVE.id] if self.OBJECTIVE and self.currentValues else None
+        bound = self.rootBound
+        gap = None if best is None or bound is None else abs(best - bound) / max(abs(best), 1)
+        return Progress(elapsed, self.NBnodes, self.NBnodes / elapsed if elapsed > 0 else 0.0, len(self.stack), store.size(), self.NBbkTot + self.NBbk, self.NBsol, best, bound, gap)
+
+    def countSolution(self): # Counting leaf, possibly the root of a subtree free of constraints
+        n = 1
+        if self.SEARCH == 2 or self.SEARCH == 3:
+            for v in self.unfixed[self.firstVar:]: n *= v.size()
+        self.NBsol += n
+        levels, d = self.levels, len(self.stack)
+        while len(levels) <= d: levels.append(0)
+        levels[d] += n
+
+    def free(self): # The unfixed variables are only involved in entailed constraints
+        for v in self.unfixed[self.firstVar:]:
+            if INF[v.id] == SUP[v.id]: continue
+            for w in v.constraints[:v.nCons]:
+                if not w[0].isEntailed(): return False
+        return True
+
+    def newSolution(self):
+        self.NBsol += 1
+        assert(Logprint.logPrint(2, "<=====****===== Found solution n°{} in {} backtracks{}".format(self.NBsol, self.NBbk, " at {}={}".format(self.OBJECTIVE.name, self.OBJECTIVE.inf if self.MINI else self.OBJECTIVE.sup) if self.OBJECTIVE else ""))==None)
+        self.saveSolution()
+        if self.shared: self.publish()
+        self.Bound = self.newBound()
+        self.bkAt -= self.NBbk
+        self.NBbkTot += self.NBbk; self.NBbk = 0
+        if self.hooks:
+            self.notify('solution', self.currentValues[self.OBJECTIVE.id] if self.OBJECTIVE else None)
+            if self.OBJECTIVE: self.notify('bound', self.Bound)
+
+    def nextValue(self):
+        x = self.nextVar()
+        return (x, x.inf) if x else False
+
+    def tryValue(self, cp, left):
+        x, v = cp
+        if left:
+            assert(Logprint.logPrint(2, "==> Try {} = {}".format(x.name, v))==None)
+            x.isEQ(v)
+        else: x.isGE(v+filter.UN)
+
+    def nextSplit(self):
+        x = self.nextVar()
+        return (x, (x.inf+x.sup)//filter.DEUX) if x else False
+
+    def trySplit(self, cp, left):
+        x, mid = cp
+        if left:
+            assert(Logprint.logPrint(2, "==> Try {} <= {}".format(x.name, mid))==None)
+            x.isLE(mid)
+        else:
+            assert(Logprint.logPrint(2, "==> Try {} > {}".format(x.name, mid))==None)
+            x.isGE(mid+filter.UN)
+
+    def nextSide(self):
+        d = self.nextDisjunction()
+        return (d, self.leftFirst(d)) if d else False
+
+    def trySide(self, cp, left):
+        d, side = cp
+        d.settled(side if left else not side)
+
+    def nextTask(self): # Unscheduled task of smallest earliest start time, postponed tasks apart
+        best = False
+        postponed = []
+        for a in self.ACTIVITIES:
+            i = a.st.id
+            est = INF[i]
+            if a.postponed is not None:
+                if est == a.postponed:
+                    if est == SUP[i]: raise filter.FAIL("*** FAIL on postponed {} ***".format(a.key)) # Cannot be delayed any more
+                    postponed.append(a)
+                    continue
+                store.assign(a, 'postponed', None) # Delayed by propagation, selectable again
+            if est != SUP[i] and (not best or est < INF[best.st.id] or est == INF[best.st.id] and SUP[i] < SUP[best.st.id]): best = a
+        if postponed: # Dominance: a postponed task must still be delayable by the tasks scheduled from now on
+            if not best: raise filter.FAIL("*** FAIL on postponed tasks ***")
+            t = INF[best.st.id]
+            for a in postponed:
+                i = a.st.id
+                if INF[i] + a.sp <= t or SUP[i] < t: raise filter.FAIL("*** FAIL on postponed {} ***".format(a.key))
+        return (best, INF[best.st.id]) if best else False
+
+    def tryTask(self, cp, left):
+        a, est = cp
+        if left:
+            assert(Logprint.logPrint(2, "==> Try {} = {}".format(a.st.name, est))==None)
+            a.st.isEQ(est)
         else:
-            self.NBsol += 1
-            assert(Logprint.logPrint(2, "<=====****===== Found solution n°{} in {} backtracks{}".format(self.NBsol, self.NBbk, " at {}={}".format(self.OBJECTIVE.name, self.OBJECTIVE.inf if self.MINI else self.OBJECTIVE.sup) if self.OBJECTIVE else ""))==None)
-            self.saveSolution()
-            self.Bound = self.newBound()
-            self.NBbkTot += self.NBbk; self.NBbk = 0
-            if self.ALLSOL: raise filter.FAIL
+            assert(Logprint.logPrint(2, "==> Postpone {}".format(a.key))==None)
+            store.assign(a, 'postponed', est)
+
+def initWorker(best, stop): # Portfolio worker process
+    Optimizer.shared = best, stop
+
+def runWorker(config): # Portfolio worker task: one configuration on the model of the parent
+    best, stop = Optimizer.shared
+    if stop.is_set(): return None
+    parent = Optimizer.leader
+    opt = Optimizer(parent.OBJECTIVE, **dict(parent.SETTINGS, **config))
+    opt.enforceBB = opt.poll
+    try: sol = opt.optimize()
+    except (RecursionError, MemoryError) as e: # Worker lost, the others go on
+        Logprint.logPrint(2, "-Worker {} failed: {!r}".format(config, e))
+        return None
+    if sol.completion: stop.set()
+    return config, sol
+
+def runSubtrees(best, stop, work, results): # Parallel worker process: subtrees of the model of the parent
+    Optimizer.shared = best, stop
+    Optimizer.work = work
+    parent = Optimizer.leader
+    settings = dict(parent.SETTINGS)
+    if parent.OBJECTIVE: settings['root'] = False # Branch and bound, restarts do not split
+    opt = Optimizer(parent.OBJECTIVE, **settings)
+    opt.enforceBB = opt.share
+    opt.solve = opt.subtrees
+    try: sol = opt.optimize()
+    except (RecursionError, MemoryError) as e: # Worker lost outside its subtrees
+        Logprint.logPrint(2, "-Worker failed: {!r}".format(e))
+        stop.set()
+        opt.lost, sol = e, None
+    results.put((sol, opt.lost))
 
 def durationPrettyPrint(start, end):
     intsecs = end - start
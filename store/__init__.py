@@ -9,8 +9,8 @@ r"""STORE: Generic Trailer
 """
 __version__ = '1.0.0'
 
-__all__ = ('clear', 'assign', 'push', 'back', 'backtrack', 'current')
+__all__ = ('clear', 'assign', 'assignAt', 'record', 'push', 'back', 'backtrack', 'current', 'size', 'changes', 'Track', 'stamping', 'getState', 'setState')
 
 __author__ = 'Pierre Savéant <pierre.saveant@thalesgroup.com>'
 
-from .store import clear, assign, push, back, backtrack, current
+from .store import clear, assign, assignAt, record, push, back, backtrack, restore, current, top, size, changes, Track, stamping, getState, setState
@@ -5,36 +5,155 @@
 # This software is released as Open Source under the terms of a 3-clause BSD license #
 #------------------------------------------------------------------------------------#
 
-from cobra.filter import Logprint
+from array import array
+from operator import setitem
 
 #------------------------------- API ------------------------------------------------#
-__all__ = ('clear', 'assign', 'push', 'back', 'backtrack', 'current')
+__all__ = ('clear', 'assign', 'assignAt', 'record', 'push', 'back', 'backtrack', 'restore', 'current', 'top', 'size', 'changes', 'Track', 'stamping', 'getState', 'setState')
 
 #------------------------------- Store -----------------------------------------------
 #  VERBOSE=0: Quiet
 #  VERBOSE=5: Trailing in Action
 
-# Assumption: only few changes occurred in each state simultaneously.
+# A world is a mark on the trails: push() and back() only move marks, then back()
+# restores the changes recorded above the mark.
+# The generic trail records (restore, obj, att, old value) tuples.
+# A Track records the changes of one integer buffer in two typed parallel arrays
+# (slot, old value), with no Python object allocated per change.
+# With timestamped trailing a Track saves a slot at most once per world: each world
+# gets a unique stamp from a clock and each slot remembers the stamp of its last save.
 
-trail = [[]]
+trail = []
+marks = [] # size of the generic trail at the creation of each world
+tracks = []
+stamps = [0] # stamp of each world
+clock = 0
+undone = 0 # changes undone by backtracking
 
-def current(): return len(trail)-1
+def tick():
+    global clock
+    clock += 1
+    return clock
+
+def current(): return len(marks)
+
+def top(): return len(trail) # Position on the generic trail, for restore()
+
+def size(): return len(trail) + sum(len(t.slots) for t in tracks) # Changes on the trails
+
+def changes(): return undone + size() # Changes recorded on the trails so far, undone ones included
 
 def clear():
-    trail = [[]]
+    del trail[:]
+    del marks[:]
+    stamps[:] = [tick()] # stamps are never reused
+    for t in tracks: t.clear()
+
+def getState(): # The trails in use, to be set back by setState()
+    return trail, marks, stamps, [t.getState() for t in tracks]
+
+def setState(state=None): # Switches to the given trails, or to empty ones
+    global trail, marks, stamps
+    if state is None:
+        trail, marks, stamps = [], [], [tick()]
+        for t in tracks: t.setState()
+    else:
+        trail, marks, stamps, saved = state
+        for t, s in zip(tracks, saved): t.setState(*s)
+
+def stamping(on=True): # Timestamped trailing mode
+    Track.assign = Track.assignOnce if on else Track.assignEach
 
 def assign(obj, att, value): # Assigns value to obj.att
     assert(Logprint.logPrint(5, "ASSIGN: {}.{}={}".format(obj, att, value))==None)
-    trail[-1].append((obj, att, getattr(obj, att)))
+    trail.append((setattr, obj, att, getattr(obj, att)))
     setattr(obj, att, value)
 
+def assignAt(seq, i, value): # Assigns value to seq[i]
+    assert(Logprint.logPrint(5, "ASSIGN: [{}]={}".format(i, value))==None)
+    trail.append((setitem, seq, i, seq[i]))
+    seq[i] = value
+
+def record(undo, obj, att=None, value=None): # undo(obj, att, value) is called on backtrack
+    trail.append((undo, obj, att, value))
+
 def push(): # Create a new world
-    assert(Logprint.logPrint(5, "PUSH: {}".format(trail))==None)
-    trail.append([])
+    assert(Logprint.logPrint(5, "PUSH: {}".format(current()+1))==None)
+    marks.append(len(trail))
+    stamps.append(tick())
+    for t in tracks: t.marks.append(len(t.slots))
 
 def back(): # Restore the previous world
-    assert(Logprint.logPrint(5, "BACK: {}".format(trail))==None)
-    for obj, att, value in reversed(trail.pop(-1)): setattr(obj, att, value)
+    assert(Logprint.logPrint(5, "BACK: {}".format(current()))==None)
+    restore(marks.pop())
+    stamps.pop()
+    for t in tracks: t.restore(t.marks.pop())
 
 def backtrack(n): # Back to world n
-    while current() > n: back()
+    if current() > n:
+        restore(marks[n])
+        del marks[n:]
+        del stamps[n+1:]
+        for t in tracks:
+            t.restore(t.marks[n])
+            del t.marks[n:]
+
+def restore(m): # Undo the generic trail down to m
+    global undone
+    undone += len(trail) - m
+    for undo, obj, att, value in reversed(trail[m:]): undo(obj, att, value)
+    del trail[m:]
+
+class Track: # Typed trail of an integer buffer
+    def __init__(self, buf):
+        self.buf = buf
+        self.setState(marks=array('l', [0] * current()))
+        tracks.append(self)
+
+    def getState(self): return self.slots, self.olds, self.marks, self.saved
+
+    def setState(self, slots=None, olds=None, marks=None, saved=None): # Switches to the given arrays, or to empty ones
+        self.slots = array('l') if slots is None else slots
+        self.olds = array('l') if olds is None else olds
+        self.marks = array('l') if marks is None else marks
+        self.saved = array('l') if saved is None else saved # stamp of the last save of each slot
+        self.saveSlot = self.slots.append
+        self.saveOld = self.olds.append
+
+    def assignEach(self, i, value): # Assigns value to buf[i]
+        assert(Logprint.logPrint(5, "ASSIGN: [{}]={}".format(i, value))==None)
+        buf = self.buf
+        self.saveSlot(i)
+        self.saveOld(buf[i])
+        buf[i] = value
+
+    def assignOnce(self, i, value): # Assigns value to buf[i], saved once per world
+        assert(Logprint.logPrint(5, "ASSIGN: [{}]={}".format(i, value))==None)
+        buf = self.buf
+        stamp = stamps[-1]
+        try: fresh = self.saved[i] != stamp
+        except IndexError:
+            self.saved.extend([-1] * (len(buf) - len(self.saved)))
+            fresh = True
+        if fresh:
+            self.saved[i] = stamp
+            self.saveSlot(i)
+            self.saveOld(buf[i])
+        buf[i] = value
+
+    assign = assignEach
+
+    def restore(self, m): # Undo the changes down to m
+        slots, olds, buf = self.slots, self.olds, self.buf
+        global undone
+        undone += len(slots) - m
+        for i, value in zip(reversed(slots[m:]), reversed(olds[m:])): buf[i] = value
+        del slots[m:]
+        del olds[m:]
+
+    def clear(self):
+        del self.slots[:]
+        del self.olds[:]
+        del self.marks[:]
+
+from cobra.filter import Logprint # Late import: cobra.filter creates its tracks at load time